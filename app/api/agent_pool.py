@@ -0,0 +1,126 @@
+import time
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledAgent:
+    def __init__(self, agent: Any):
+        self.agent = agent
+        self.created_at = time.monotonic()
+        self.checked_at = self.created_at
+        self.uses = 0
+
+
+class AgentPool:
+    """Pool of long-lived agent clients shared by all chat requests.
+
+    Agents are built once (``warm`` at startup) and reused, so a chat turn
+    does not pay for client construction, auth and channel setup. An agent
+    whose call raises is discarded and replaced by a fresh one on demand;
+    agents older than ``max_age`` seconds are recycled the same way.
+    ``health_check``, if given, is run on every agent built by ``warm``,
+    and again before an agent is handed out if it was last checked more
+    than ``check_interval`` seconds ago, so a dead client is replaced
+    before a chat request trips over it.
+    """
+
+    def __init__(self, factory: Callable[[], Any], size: int = 4, max_age: float = 3600,
+                 health_check: Optional[Callable[[Any], bool]] = None, check_interval: float = 300):
+        self.factory = factory
+        self.size = size
+        self.max_age = max_age
+        self.health_check = health_check
+        self.check_interval = check_interval
+        self._idle: "queue.LifoQueue[_PooledAgent]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._recycled = 0
+
+    def _reserve(self) -> bool:
+        """Claim a free slot for a new agent; False when the pool is full"""
+        with self._lock:
+            if self._created >= self.size:
+                return False
+            self._created += 1
+            return True
+
+    def _create(self) -> _PooledAgent:
+        """Build an agent in a slot claimed with ``_reserve``, releasing the slot if that fails"""
+        try:
+            return _PooledAgent(self.factory())
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def _discard(self, pooled: _PooledAgent, reason: str):
+        logger.warning(f"Recycling agent client after {pooled.uses} uses: {reason}")
+        with self._lock:
+            self._created -= 1
+            self._recycled += 1
+
+    def _healthy(self, pooled: _PooledAgent) -> bool:
+        if self.health_check is None:
+            return True
+        try:
+            healthy = bool(self.health_check(pooled.agent))
+        except Exception as e:
+            logger.warning(f"Agent health check raised: {e}")
+            healthy = False
+        pooled.checked_at = time.monotonic()
+        return healthy
+
+    def warm(self):
+        """Build (and health-check) agents until the pool is full"""
+        while self._reserve():
+            try:
+                pooled = self._create()
+            except Exception as e:
+                logger.error(f"Could not create agent client during warm-up: {e}")
+                break
+            if not self._healthy(pooled):
+                self._discard(pooled, "health check failed during warm-up")
+                break
+            self._idle.put(pooled)
+        logger.info(f"Agent pool warmed with {self._idle.qsize()} clients")
+
+    def _checkout(self, timeout: Optional[float]) -> _PooledAgent:
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                pooled = self._create() if self._reserve() else self._idle.get(timeout=timeout)
+            if time.monotonic() - pooled.created_at > self.max_age:
+                self._discard(pooled, "max age reached")
+                continue
+            if time.monotonic() - pooled.checked_at > self.check_interval and not self._healthy(pooled):
+                self._discard(pooled, "health check failed")
+                continue
+            return pooled
+
+    @contextmanager
+    def acquire(self, timeout: Optional[float] = None):
+        """Borrow an agent for the duration of the ``with`` block"""
+        pooled = self._checkout(timeout)
+        try:
+            yield pooled.agent
+        except Exception as e:
+            self._discard(pooled, f"call failed: {e}")
+            raise
+        except BaseException:
+            # Interrupted mid-call (e.g. an abandoned stream); the client may be mid-request
+            self._discard(pooled, "call interrupted")
+            raise
+        else:
+            pooled.uses += 1
+            self._idle.put(pooled)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": self.size, "created": self._created, "idle": self._idle.qsize(),
+                    "recycled": self._recycled}
@@ -0,0 +1,100 @@
+import re
+import logging
+from typing import Callable, List
+
+from conversation_store import Conversation, ConversationStore
+
+logger = logging.getLogger(__name__)
+
+# CJK characters are roughly one token each; other text roughly four characters per token
+_CJK_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯＀-￯]")
+
+
+def estimate_tokens(text: str) -> int:
+    text = text or ""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Keep the end of ``text`` (the most recent part) within ``max_tokens``"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if estimate_tokens(text[mid:]) <= max_tokens:
+            hi = mid
+        else:
+            lo = mid + 1
+    return "…" + text[lo:]
+
+
+def extractive_summary(previous: str, messages: List[dict], max_tokens: int) -> str:
+    """Model-free fallback: append the first sentence of each message to the summary"""
+    lines = [previous] if previous else []
+    for message in messages:
+        first = re.split(r"(?<=[.!?。！？])\s*", (message.get("content") or "").strip(), maxsplit=1)[0]
+        lines.append(f"{message.get('role')}: {first[:200]}")
+    return truncate_to_tokens("\n".join(lines), max_tokens)
+
+
+class ContextWindow:
+    """Bounds the history sent to the model for each chat turn.
+
+    The newest messages are sent verbatim, up to ``max_messages`` and
+    ``token_budget`` tokens. Older ones are folded into a rolling summary
+    kept on the conversation: ``summarize(previous_summary, messages)``
+    only sees the messages evicted since the last update. When the window
+    overflows it is cut back to ``refill_ratio`` of its limits, so the
+    summary is updated once every few turns rather than on every turn.
+    """
+
+    def __init__(self, store: ConversationStore, summarize: Callable[[str, List[dict]], str],
+                 max_messages: int = 20, token_budget: int = 2000, summary_max_tokens: int = 400,
+                 refill_ratio: float = 0.5):
+        self.store = store
+        self.summarize = summarize
+        self.max_messages = max_messages
+        self.token_budget = token_budget
+        self.summary_max_tokens = summary_max_tokens
+        self.refill_ratio = refill_ratio
+
+    def _fits(self, messages: List[dict], max_messages: float, budget: float) -> bool:
+        return len(messages) <= max_messages and sum(estimate_tokens(m.get("content")) for m in messages) <= budget
+
+    def _tail_start(self, messages: List[dict], start: int) -> int:
+        """First index of the longest tail of ``messages[start:]`` within the refill limits"""
+        max_messages = max(1, int(self.max_messages * self.refill_ratio))
+        budget = self.token_budget * self.refill_ratio
+        used = 0
+        index = len(messages)
+        while index > start and len(messages) - index < max_messages:
+            cost = estimate_tokens(messages[index - 1].get("content"))
+            if used + cost > budget and index < len(messages):
+                break
+            used += cost
+            index -= 1
+        return index
+
+    def build(self, conversation: Conversation) -> List[dict]:
+        """History for the next turn: the rolling summary, then the recent messages verbatim"""
+        with conversation.summary_lock:
+            messages = list(conversation.messages)
+            start = conversation.summarized_upto
+            if not self._fits(messages[start:], self.max_messages, self.token_budget):
+                cut = self._tail_start(messages, start)
+                evicted = messages[start:cut]
+                try:
+                    summary = self.summarize(conversation.summary, evicted)
+                except Exception as e:
+                    logger.error(f"Summarizing conversation {conversation.id} failed, using extract: {e}")
+                    summary = extractive_summary(conversation.summary, evicted, self.summary_max_tokens)
+                summary = truncate_to_tokens(summary, self.summary_max_tokens)
+                self.store.set_summary(conversation, summary, cut)
+                logger.info(f"Folded {len(evicted)} messages of conversation {conversation.id} into its summary")
+            history = messages[conversation.summarized_upto:]
+            if conversation.summary:
+                history.insert(0, {"role": "system",
+                                   "content": f"Summary of the earlier conversation: {conversation.summary}"})
+            return history
@@ -0,0 +1,129 @@
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+@dataclass
+class Conversation:
+    id: str
+    user_id: str
+    messages: List[dict] = field(default_factory=list)
+    # Rolling summary of messages[:summarized_upto], maintained by the context window
+    summary: str = ""
+    summarized_upto: int = 0
+    # False until ``ConversationStore.persist`` has written the conversation's file
+    persisted: bool = True
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+    summary_lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+
+class ConversationStore:
+    """Server-side chat history, so clients only send the newest message.
+
+    Each conversation is an append-only JSONL file under ``root``: a header
+    line with the owner, then one line per message, interleaved with
+    ``summary`` lines recording the latest rolling summary. Recently used
+    conversations are kept in memory (LRU, ``max_cached`` entries), so a
+    turn costs one appended line rather than re-sending the whole history.
+    A conversation started with ``new`` lives only in memory until
+    ``persist`` is called, so requests that are turned away leave no file.
+    """
+
+    def __init__(self, root: str, max_cached: int = 1000):
+        self.root = root
+        self.max_cached = max_cached
+        os.makedirs(root, exist_ok=True)
+        self._cache: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, conversation_id: str) -> str:
+        return os.path.join(self.root, f"{conversation_id}.jsonl")
+
+    def _remember(self, conversation: Conversation):
+        with self._lock:
+            self._cache[conversation.id] = conversation
+            self._cache.move_to_end(conversation.id)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+
+    def new(self, user_id: str, messages: Iterable[dict] = ()) -> Conversation:
+        """Start a conversation in memory only; nothing is written until ``persist``"""
+        entries = [{"role": m.get("role"), "content": m.get("content"), "ts": time.time()} for m in messages]
+        return Conversation(id=uuid.uuid4().hex, user_id=user_id, messages=entries, persisted=False)
+
+    def persist(self, conversation: Conversation):
+        """Write a conversation started with ``new`` to disk; a no-op once it has been"""
+        with conversation.lock:
+            if conversation.persisted:
+                return
+            lines = [{"type": "meta", "user_id": conversation.user_id, "created_at": time.time()}]
+            lines += conversation.messages
+            if conversation.summary:
+                lines.append({"type": "summary", "content": conversation.summary,
+                              "upto": conversation.summarized_upto, "ts": time.time()})
+            with open(self._path(conversation.id), "w") as fp:
+                fp.writelines(json.dumps(line, ensure_ascii=False) + "\n" for line in lines)
+            conversation.persisted = True
+        self._remember(conversation)
+        logger.info(f"Created conversation {conversation.id} for {conversation.user_id}")
+
+    def create(self, user_id: str, messages: Iterable[dict] = ()) -> Conversation:
+        conversation = self.new(user_id, messages)
+        self.persist(conversation)
+        return conversation
+
+    def get(self, conversation_id: str) -> Optional[Conversation]:
+        if not _ID_RE.match(conversation_id or ""):
+            return None
+        with self._lock:
+            conversation = self._cache.get(conversation_id)
+            if conversation is not None:
+                self._cache.move_to_end(conversation_id)
+                return conversation
+        try:
+            with open(self._path(conversation_id)) as fp:
+                meta = json.loads(fp.readline())
+                entries = [json.loads(line) for line in fp if line.strip()]
+        except FileNotFoundError:
+            return None
+        conversation = Conversation(id=conversation_id, user_id=meta.get("user_id"))
+        for entry in entries:
+            if entry.get("type") == "summary":
+                conversation.summary = entry["content"]
+                conversation.summarized_upto = entry["upto"]
+            else:
+                conversation.messages.append(entry)
+        self._remember(conversation)
+        return conversation
+
+    def append(self, conversation: Conversation, messages: Iterable[dict]):
+        """Add messages ({"role", "content"}) to the end of ``conversation``"""
+        entries = [{"role": m.get("role"), "content": m.get("content"), "ts": time.time()} for m in messages]
+        if not entries:
+            return
+        with conversation.lock:
+            if conversation.persisted:
+                with open(self._path(conversation.id), "a") as fp:
+                    fp.writelines(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+            conversation.messages.extend(entries)
+
+    def set_summary(self, conversation: Conversation, summary: str, upto: int):
+        """Record that ``summary`` now covers the first ``upto`` messages"""
+        entry = {"type": "summary", "content": summary, "upto": upto, "ts": time.time()}
+        with conversation.lock:
+            if conversation.persisted:
+                with open(self._path(conversation.id), "a") as fp:
+                    fp.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            conversation.summary = summary
+            conversation.summarized_upto = upto
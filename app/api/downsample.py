@@ -0,0 +1,102 @@
+from typing import Dict
+
+import numpy as np
+
+# How each price column is combined when several bars fall in one bucket
+OHLC_AGGREGATES = {
+    "Date": "first",
+    "Open": "first",
+    "High": "max",
+    "Low": "min",
+    "Close": "last",
+    "Volume": "sum",
+}
+
+
+def bucket_starts(n: int, max_points: int) -> np.ndarray:
+    """Start index of each of at most ``max_points`` near-equal buckets over n bars"""
+    buckets = min(n, max_points)
+    return np.unique(np.linspace(0, n, buckets, endpoint=False).astype(np.int64))
+
+
+def ohlc_downsample(columns: Dict[str, np.ndarray], max_points: int) -> Dict[str, np.ndarray]:
+    """Merge consecutive bars into at most ``max_points`` bars.
+
+    Each bucket keeps the first open, the highest high, the lowest low, the
+    last close and the summed volume, so candles still show the true range.
+    Other columns (indicators) take their value at the end of the bucket.
+    """
+    n = len(columns["Date"])
+    if n <= max_points:
+        return columns
+    starts = bucket_starts(n, max_points)
+    ends = np.append(starts[1:], n) - 1
+    result = {}
+    for name, values in columns.items():
+        how = OHLC_AGGREGATES.get(name, "last")
+        if how == "first":
+            result[name] = values[starts]
+        elif how == "last":
+            result[name] = values[ends]
+        elif how == "max":
+            result[name] = np.maximum.reduceat(values, starts)
+        elif how == "min":
+            result[name] = np.minimum.reduceat(values, starts)
+        else:
+            result[name] = np.add.reduceat(values, starts)
+    return result
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """Indices picked by Largest-Triangle-Three-Buckets for the line (x, y)"""
+    n = len(x)
+    if n <= max_points:
+        return np.arange(n)
+    if max_points < 3:
+        # No bucket between the endpoints: keep the first point, and the last if there is room
+        return np.array([0, n - 1][:max_points], dtype=np.int64)
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    # The first and last points are always kept; the rest is split into buckets
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    prev = 0
+    for i in range(max_points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        # Average of the next bucket is the third vertex of the triangle
+        avg_x = x[hi:next_hi].mean()
+        avg_y = y[hi:next_hi].mean()
+        area = np.abs(
+            (x[prev] - avg_x) * (y[lo:hi] - y[prev])
+            - (x[prev] - x[lo:hi]) * (avg_y - y[prev])
+        )
+        prev = lo + int(np.argmax(area))
+        selected[i + 1] = prev
+    return selected
+
+
+def lttb_downsample(columns: Dict[str, np.ndarray], max_points: int, value_column: str = "Close") -> Dict[str, np.ndarray]:
+    """Keep the bars LTTB selects on ``value_column``, with all their columns"""
+    dates = columns["Date"]
+    if len(dates) <= max_points:
+        return columns
+    x = dates.astype("datetime64[D]").astype(np.int64)
+    keep = lttb_indices(x, columns[value_column], max_points)
+    return {name: values[keep] for name, values in columns.items()}
+
+
+DOWNSAMPLERS = {
+    "ohlc": ohlc_downsample,
+    "lttb": lttb_downsample,
+}
+
+
+def downsample(columns: Dict[str, np.ndarray], max_points: int, method: str = "ohlc") -> Dict[str, np.ndarray]:
+    if method not in DOWNSAMPLERS:
+        raise ValueError(f"Unknown downsampling method: {method} (expected one of {', '.join(DOWNSAMPLERS)})")
+    if max_points < 1:
+        raise ValueError("max_points must be positive")
+    return DOWNSAMPLERS[method](columns, max_points)
@@ -0,0 +1,114 @@
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Firestore rejects batches with more than 500 writes
+MAX_BATCH_SIZE = 500
+
+
+def fingerprint(data: Any) -> str:
+    """Stable hash of a JSON-like value, used to skip unchanged writes"""
+    encoded = json.dumps(data, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+class WriteBehindQueue:
+    """Coalescing write-behind queue for Firestore documents.
+
+    ``submit`` only records the write; a background thread commits pending
+    writes in batches every ``flush_interval`` seconds. Writes are coalesced
+    by ``key`` (the latest one wins) and dropped when their fingerprint
+    matches the last write committed for that key. Only the fingerprints of
+    the ``max_written`` most recently written keys are remembered; an older
+    key that is submitted again is simply rewritten.
+    """
+
+    def __init__(self, client, flush_interval: float = 2.0, max_pending: int = 5000,
+                 max_written: int = 10000):
+        self.client = client
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_written = max_written
+        self._pending: Dict[str, Tuple[Any, dict, str]] = {}
+        self._written: "OrderedDict[str, str]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="firestore-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, key: str, ref, data: dict, digest_of: Any = None) -> bool:
+        """Queue ``data`` to be written to ``ref``; return False if it was unchanged.
+
+        ``digest_of`` is what the change check hashes, defaulting to ``data``;
+        pass the payload alone when ``data`` also carries a timestamp.
+        """
+        digest = fingerprint(data if digest_of is None else digest_of)
+        with self._cond:
+            pending = self._pending.get(key)
+            if pending is not None and pending[2] == digest:
+                return False
+            if pending is None and self._written.get(key) == digest:
+                return False
+            self._pending[key] = (ref, data, digest)
+            if len(self._pending) >= self.max_pending:
+                self._cond.notify()
+        return True
+
+    def flush(self):
+        """Commit everything queued so far on the calling thread"""
+        with self._cond:
+            pending, self._pending = self._pending, {}
+        items = list(pending.items())
+        for start in range(0, len(items), MAX_BATCH_SIZE):
+            chunk = items[start:start + MAX_BATCH_SIZE]
+            try:
+                batch = self.client.batch()
+                for _, (ref, data, _) in chunk:
+                    batch.set(ref, data)
+                batch.commit()
+            except Exception as e:
+                logger.error(f"Firestore batch write of {len(chunk)} documents failed: {e}")
+                self._requeue(chunk)
+                continue
+            with self._cond:
+                for key, (_, _, digest) in chunk:
+                    self._written[key] = digest
+                    self._written.move_to_end(key)
+                while len(self._written) > self.max_written:
+                    self._written.popitem(last=False)
+            logger.info(f"Committed {len(chunk)} documents to Firestore")
+
+    def _requeue(self, chunk):
+        with self._cond:
+            for key, entry in chunk:
+                # A newer submission for the same key supersedes the failed one
+                self._pending.setdefault(key, entry)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._pending) < self.max_pending:
+                    self._cond.wait(self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def close(self, timeout: float = 10.0):
+        """Stop the worker after committing whatever is still queued"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        else:
+            self.flush()
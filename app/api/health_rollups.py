@@ -0,0 +1,156 @@
+import logging
+import datetime as dt
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Numeric sample fields that are rolled up, with the histogram bucket width used for percentiles
+METRIC_BUCKET_WIDTHS = {"steps": 250, "sleep_hours": 0.25, "heart_rate": 1}
+
+GRANULARITIES = ("day", "week")
+
+logger = logging.getLogger(__name__)
+
+
+def parse_sync_time(value) -> dt.datetime:
+    """Parse an ISO 8601 ``last_sync``; a trailing ``Z`` is accepted (Python 3.10 rejects it)"""
+    if not isinstance(value, str):
+        raise ValueError(f"last_sync must be an ISO 8601 string, got {value!r}")
+    try:
+        return dt.datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"last_sync is not an ISO 8601 timestamp: {value!r}")
+
+
+def sample_date(record: dict) -> dt.date:
+    """Day a sample belongs to: its ``last_sync`` date, or when it was received"""
+    try:
+        return parse_sync_time(record["sample"].get("last_sync")).date()
+    except ValueError as e:
+        logger.warning(f"Filing health sample {record.get('seq')} by its arrival time: {e}")
+        return dt.datetime.fromtimestamp(record.get("received_at", 0)).date()
+
+
+def period_key(day: dt.date, granularity: str) -> str:
+    if granularity == "week":
+        day -= dt.timedelta(days=day.weekday())
+    return day.isoformat()
+
+
+def _add(stats: dict, value: float, width: float):
+    if stats["count"] == 0:
+        stats["min"] = stats["max"] = value
+    else:
+        stats["min"] = min(stats["min"], value)
+        stats["max"] = max(stats["max"], value)
+    stats["count"] += 1
+    stats["sum"] += value
+    # JSON object keys are strings, so are the bucket indices
+    bucket = str(int(value // width))
+    stats["hist"][bucket] = stats["hist"].get(bucket, 0) + 1
+
+
+def _percentile(stats: dict, q: float, width: float) -> float:
+    """Approximate percentile from the histogram, to within one bucket width"""
+    rank = q / 100 * stats["count"]
+    seen = 0
+    for bucket in sorted(stats["hist"], key=int):
+        seen += stats["hist"][bucket]
+        if seen >= rank:
+            value = (int(bucket) + 0.5) * width
+            return min(max(value, stats["min"]), stats["max"])
+    return stats["max"]
+
+
+def summarize(stats: dict, metric: str, percentiles: Iterable[float]) -> dict:
+    width = METRIC_BUCKET_WIDTHS[metric]
+    summary = {
+        "count": stats["count"],
+        "sum": stats["sum"],
+        "mean": stats["sum"] / stats["count"],
+        "min": stats["min"],
+        "max": stats["max"],
+    }
+    for q in percentiles:
+        summary[f"p{q:g}"] = _percentile(stats, q, width)
+    return summary
+
+
+class HealthRollups:
+    """Daily and weekly aggregates of one user's health samples.
+
+    Each period holds, per metric, the count, sum, min, max and a sparse
+    histogram, all of which can be updated with one sample at a time; means
+    and percentiles are derived when a series is read. Serving a range costs
+    one entry per period, independent of how many samples it covers.
+    """
+
+    def __init__(self, data: Optional[dict] = None):
+        data = data or {}
+        self.seq: int = data.get("seq", 0)
+        self.periods: Dict[str, Dict[str, Dict[str, dict]]] = {
+            granularity: data.get(granularity, {}) for granularity in GRANULARITIES
+        }
+
+    def to_dict(self) -> dict:
+        return {"seq": self.seq, **self.periods}
+
+    def add(self, record: dict) -> List[Tuple[str, str]]:
+        """Fold one stored sample record (``{"seq", "received_at", "sample"}``) into the rollups.
+
+        Returns the ``(granularity, period)`` pairs it updated.
+        """
+        if record["seq"] <= self.seq:
+            return []
+        day = sample_date(record)
+        touched = []
+        for granularity in GRANULARITIES:
+            key = period_key(day, granularity)
+            touched.append((granularity, key))
+            period = self.periods[granularity].setdefault(key, {})
+            for metric, width in METRIC_BUCKET_WIDTHS.items():
+                value = record["sample"].get(metric)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    stats = period.setdefault(metric, {"count": 0, "sum": 0, "min": None, "max": None, "hist": {}})
+                    _add(stats, value, width)
+        self.seq = record["seq"]
+        return touched
+
+    def delta(self, touched: Iterable[Tuple[str, str]]) -> dict:
+        """Current state of the ``touched`` periods, to be replayed with ``apply``"""
+        data = {"seq": self.seq}
+        for granularity, key in touched:
+            data.setdefault(granularity, {})[key] = self.periods[granularity][key]
+        return data
+
+    def apply(self, delta: dict):
+        """Replace periods with those of a ``delta``; deltas older than the rollups are ignored"""
+        if delta["seq"] <= self.seq:
+            return
+        for granularity in GRANULARITIES:
+            self.periods[granularity].update(delta.get(granularity, {}))
+        self.seq = delta["seq"]
+
+    def series(self, granularity: str, start: Optional[dt.date], end: Optional[dt.date],
+               metrics: Iterable[str], percentiles: Iterable[float]) -> List[dict]:
+        """Aggregates for every period overlapping ``start``..``end`` (inclusive), oldest first"""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+        metrics, percentiles = list(metrics), list(percentiles)
+        for metric in metrics:
+            if metric not in METRIC_BUCKET_WIDTHS:
+                raise ValueError(f"Unknown metric: {metric}")
+        for q in percentiles:
+            if not 0 <= q <= 100:
+                raise ValueError(f"Percentile out of range: {q}")
+        low = period_key(start, granularity) if start else None
+        high = end.isoformat() if end else None
+        buckets = []
+        for key in sorted(self.periods[granularity]):
+            if (low and key < low) or (high and key > high):
+                continue
+            period = self.periods[granularity][key]
+            buckets.append({
+                "period": key,
+                "metrics": {metric: summarize(period[metric], metric, percentiles)
+                            for metric in metrics if metric in period},
+            })
+        return buckets
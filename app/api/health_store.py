@@ -0,0 +1,198 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+from health_rollups import HealthRollups
+
+logger = logging.getLogger(__name__)
+
+_USER_ID_RE = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9_.@-]{0,127}$")
+
+SAMPLES_FILE = "samples.jsonl"
+LATEST_FILE = "latest.json"
+ROLLUPS_FILE = "rollups.json"
+ROLLUPS_LOG = "rollups.log"
+
+# Rollup log lines replayed on load before they are compacted into ROLLUPS_FILE
+ROLLUPS_COMPACT_LINES = 500
+
+
+def validate_user_id(user_id: str):
+    if not _USER_ID_RE.match(user_id or ""):
+        raise ValueError(f"Invalid user_id: {user_id!r}")
+
+
+class HealthStore:
+    """Health samples partitioned per user under ``root/<user_id>/``.
+
+    Every sample is appended to ``samples.jsonl``; ``latest.json`` is then
+    atomically replaced with the newest sample and its sequence number. So
+    reading the latest sample is one stat (plus one small read when it
+    changed), however much history the user has, and ``seq`` identifies
+    the version for ETags. Daily and weekly rollups are updated with each
+    appended sample: the day and week it touched are appended to
+    ``rollups.log``, which is folded into the ``rollups.json`` snapshot every
+    ``ROLLUPS_COMPACT_LINES`` lines, so a write costs the same however long
+    the history is. The rollups are rebuilt from the samples only if they
+    fall behind them (e.g. after a crash between the writes).
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._latest: Dict[str, Tuple[int, dict]] = {}
+        # user_id -> ((snapshot mtime, log size), rollups, log lines)
+        self._rollups: Dict[str, Tuple[Tuple[int, int], HealthRollups, int]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _user_dir(self, user_id: str) -> str:
+        validate_user_id(user_id)
+        return os.path.join(self.root, user_id)
+
+    def _lock(self, user_id: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(user_id, threading.Lock())
+
+    def latest(self, user_id: str) -> Optional[dict]:
+        """Return ``{"seq", "sample"}`` for the newest sample of ``user_id``, or None"""
+        path = os.path.join(self._user_dir(user_id), LATEST_FILE)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        cached = self._latest.get(user_id)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with open(path) as fp:
+            record = json.load(fp)
+        self._latest[user_id] = (mtime, record)
+        return record
+
+    @staticmethod
+    def _write_json(path: str, data: dict):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as fp:
+            json.dump(data, fp)
+        os.replace(tmp_path, path)
+
+    def _rollups_signature(self, user_id: str) -> Tuple[int, int]:
+        user_dir = self._user_dir(user_id)
+        signature = []
+        for name, field in ((ROLLUPS_FILE, "st_mtime_ns"), (ROLLUPS_LOG, "st_size")):
+            try:
+                signature.append(getattr(os.stat(os.path.join(user_dir, name)), field))
+            except FileNotFoundError:
+                signature.append(0)
+        return tuple(signature)
+
+    def _load_rollups(self, user_id: str) -> HealthRollups:
+        """The snapshot with the log replayed on top, re-read only if either changed on disk"""
+        signature = self._rollups_signature(user_id)
+        cached = self._rollups.get(user_id)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        user_dir = self._user_dir(user_id)
+        try:
+            with open(os.path.join(user_dir, ROLLUPS_FILE)) as fp:
+                rollups = HealthRollups(json.load(fp))
+        except FileNotFoundError:
+            rollups = HealthRollups()
+        lines = 0
+        try:
+            with open(os.path.join(user_dir, ROLLUPS_LOG)) as fp:
+                for line in fp:
+                    try:
+                        delta = json.loads(line)
+                    except ValueError:
+                        # Torn write: the rollups now lag the samples and are caught up from them
+                        break
+                    rollups.apply(delta)
+                    lines += 1
+        except FileNotFoundError:
+            pass
+        self._rollups[user_id] = (signature, rollups, lines)
+        return rollups
+
+    def _save_rollups(self, user_id: str, rollups: HealthRollups):
+        """Write a full snapshot and drop the log it supersedes"""
+        user_dir = self._user_dir(user_id)
+        self._write_json(os.path.join(user_dir, ROLLUPS_FILE), rollups.to_dict())
+        try:
+            os.remove(os.path.join(user_dir, ROLLUPS_LOG))
+        except FileNotFoundError:
+            pass
+        self._rollups[user_id] = (self._rollups_signature(user_id), rollups, 0)
+
+    def _log_rollups(self, user_id: str, rollups: HealthRollups, touched):
+        """Persist the ``touched`` periods of ``rollups``, compacting the log when it gets long"""
+        lines = self._rollups[user_id][2] + 1 if user_id in self._rollups else 1
+        if lines >= ROLLUPS_COMPACT_LINES:
+            self._save_rollups(user_id, rollups)
+            return
+        with open(os.path.join(self._user_dir(user_id), ROLLUPS_LOG), "a") as fp:
+            fp.write(json.dumps(rollups.delta(touched)) + "\n")
+        self._rollups[user_id] = (self._rollups_signature(user_id), rollups, lines)
+
+    def _catch_up(self, user_id: str, rollups: HealthRollups) -> HealthRollups:
+        """Fold samples newer than the rollups into them, reading the sample log only if needed"""
+        latest = self.latest(user_id)
+        if latest is None or latest["seq"] <= rollups.seq:
+            return rollups
+        logger.info(f"Rebuilding health rollups of {user_id} from seq {rollups.seq}")
+        with open(os.path.join(self._user_dir(user_id), SAMPLES_FILE)) as fp:
+            for line in fp:
+                if line.strip():
+                    rollups.add(json.loads(line))
+        self._save_rollups(user_id, rollups)
+        return rollups
+
+    def rollups(self, user_id: str) -> HealthRollups:
+        """Daily and weekly aggregates of ``user_id``'s samples"""
+        rollups = self._load_rollups(user_id)
+        latest = self.latest(user_id)
+        if latest is not None and latest["seq"] > rollups.seq:
+            with self._lock(user_id):
+                rollups = self._catch_up(user_id, self._load_rollups(user_id))
+        return rollups
+
+    def append(self, user_id: str, sample: dict) -> dict:
+        """Store ``sample`` as the newest one for ``user_id`` and return its latest record"""
+        user_dir = self._user_dir(user_id)
+        with self._lock(user_id):
+            os.makedirs(user_dir, exist_ok=True)
+            previous = self.latest(user_id)
+            record = {"seq": (previous["seq"] + 1) if previous else 1,
+                      "received_at": time.time(), "sample": sample}
+            with open(os.path.join(user_dir, SAMPLES_FILE), "a") as fp:
+                fp.write(json.dumps(record) + "\n")
+            path = os.path.join(user_dir, LATEST_FILE)
+            self._write_json(path, record)
+            self._latest[user_id] = (os.stat(path).st_mtime_ns, record)
+            rollups = self._load_rollups(user_id)
+            if rollups.seq == record["seq"] - 1:
+                self._log_rollups(user_id, rollups, rollups.add(record))
+            else:
+                self._catch_up(user_id, rollups)
+            return record
+
+    def import_legacy(self, user_id: str):
+        """Move flat ``root/*.json`` samples (written before partitioning) into ``user_id``'s history"""
+        files = sorted(f for f in os.listdir(self.root)
+                       if f.endswith(".json") and os.path.isfile(os.path.join(self.root, f)))
+        for name in files:
+            path = os.path.join(self.root, name)
+            try:
+                with open(path) as fp:
+                    sample = json.load(fp)
+            except Exception as e:
+                logger.error(f"Could not import legacy health file {name}: {e}")
+                continue
+            self.append(user_id, sample)
+            os.remove(path)
+        if files:
+            logger.info(f"Imported {len(files)} legacy health files for {user_id}")
@@ -0,0 +1,34 @@
+import hashlib
+from typing import Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag derived from the given version components"""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match already names ``etag``"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    # If-None-Match uses the weak comparison, so W/"x" matches "x"
+    return any(tag[2:] == etag if tag.startswith("W/") else tag == etag for tag in candidates)
+
+
+def cache_headers(etag: str, max_age: int, vary: Optional[str] = None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={max_age}"}
+    if vary:
+        headers["Vary"] = vary
+    return headers
+
+
+def not_modified(etag: str, max_age: int, vary: Optional[str] = None) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, max_age, vary))
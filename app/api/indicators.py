@@ -0,0 +1,289 @@
+import re
+import math
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from stock_store import StockSeries
+
+
+def rolling_mean(x: np.ndarray, window: int) -> np.ndarray:
+    """Mean over the trailing ``window`` values; the first window-1 entries are NaN"""
+    out = np.full(len(x), np.nan)
+    if len(x) >= window:
+        csum = np.cumsum(np.concatenate(([0.0], x)))
+        out[window - 1:] = (csum[window:] - csum[:-window]) / window
+    return out
+
+
+def rolling_std(x: np.ndarray, window: int) -> np.ndarray:
+    """Population standard deviation over the trailing ``window`` values"""
+    out = np.full(len(x), np.nan)
+    if len(x) >= window:
+        out[window - 1:] = np.lib.stride_tricks.sliding_window_view(x, window).std(axis=1)
+    return out
+
+
+def ema(x: np.ndarray, alpha: float, prev: float = np.nan) -> np.ndarray:
+    """Exponential moving average continuing from ``prev`` (NaN: seed with x[0]).
+
+    The recurrence is evaluated in blocks with a closed form, so the work is
+    done by NumPy rather than a Python loop over every bar.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    out = np.empty(len(x))
+    if not len(x):
+        return out
+    if math.isnan(prev):
+        prev = x[0]
+    if alpha >= 1.0:
+        out[:] = x
+        return out
+    decay = 1.0 - alpha
+    # Keep decay ** -block well inside the float64 range
+    block = max(1, min(256, int(150 / -math.log10(decay))))
+    powers = decay ** np.arange(block + 1)
+    for start in range(0, len(x), block):
+        chunk = x[start:start + block]
+        k = len(chunk)
+        # out[j] = decay^(j+1) * prev + alpha * sum_{i<=j} decay^(j-i) * chunk[i]
+        scaled = np.cumsum(chunk / powers[:k])
+        out[start:start + k] = powers[1:k + 1] * prev + alpha * powers[:k] * scaled
+        prev = out[start + k - 1]
+    return out
+
+
+class Indicator:
+    """One configured indicator.
+
+    Windowed indicators recompute new values from the raw bars before them;
+    recursive ones (EMA, RSI, MACD) continue from the ``state`` they return.
+    """
+
+    def output_names(self) -> List[str]:
+        raise NotImplementedError
+
+    def initial_state(self):
+        return None
+
+    def compute(self, cols: Dict[str, np.ndarray], lo: int, hi: int, state):
+        """Return (outputs for bars lo..hi-1, state after bar hi-1)"""
+        raise NotImplementedError
+
+
+class SMA(Indicator):
+    def __init__(self, window: int = 20):
+        self.window = window
+
+    def output_names(self):
+        return [f"SMA{self.window}"]
+
+    def compute(self, cols, lo, hi, state):
+        start = max(0, lo - self.window + 1)
+        out = rolling_mean(cols["Close"][start:hi], self.window)[lo - start:]
+        return {f"SMA{self.window}": out}, state
+
+
+class EMA(Indicator):
+    def __init__(self, window: int = 20):
+        self.window = window
+
+    def output_names(self):
+        return [f"EMA{self.window}"]
+
+    def initial_state(self):
+        return np.nan
+
+    def compute(self, cols, lo, hi, state):
+        out = ema(cols["Close"][lo:hi], 2.0 / (self.window + 1), state)
+        return {f"EMA{self.window}": out}, out[-1] if len(out) else state
+
+
+class RSI(Indicator):
+    """Wilder's RSI, smoothing gains and losses with alpha = 1 / window"""
+
+    def __init__(self, window: int = 14):
+        self.window = window
+
+    def output_names(self):
+        return [f"RSI{self.window}"]
+
+    def initial_state(self):
+        # (previous close, average gain, average loss, bars seen)
+        return (np.nan, np.nan, np.nan, 0)
+
+    def compute(self, cols, lo, hi, state):
+        prev_close, avg_gain, avg_loss, seen = state
+        close = cols["Close"][lo:hi]
+        diff = np.diff(close, prepend=prev_close if seen else close[0])
+        alpha = 1.0 / self.window
+        gains = ema(np.clip(diff, 0, None), alpha, avg_gain)
+        losses = ema(np.clip(-diff, 0, None), alpha, avg_loss)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out = 100.0 - 100.0 / (1.0 + gains / losses)
+        out[losses == 0] = 100.0
+        warmup = self.window - seen
+        if warmup > 0:
+            out[:warmup] = np.nan
+        new_state = (close[-1], gains[-1], losses[-1], seen + len(close)) if len(close) else state
+        return {f"RSI{self.window}": out}, new_state
+
+
+class MACD(Indicator):
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self.fast, self.slow, self.signal = fast, slow, signal
+
+    def output_names(self):
+        return ["MACD", "MACD_signal", "MACD_hist"]
+
+    def initial_state(self):
+        return (np.nan, np.nan, np.nan)
+
+    def compute(self, cols, lo, hi, state):
+        close = cols["Close"][lo:hi]
+        fast = ema(close, 2.0 / (self.fast + 1), state[0])
+        slow = ema(close, 2.0 / (self.slow + 1), state[1])
+        macd = fast - slow
+        signal = ema(macd, 2.0 / (self.signal + 1), state[2])
+        outputs = {"MACD": macd, "MACD_signal": signal, "MACD_hist": macd - signal}
+        new_state = (fast[-1], slow[-1], signal[-1]) if len(close) else state
+        return outputs, new_state
+
+
+class BollingerBands(Indicator):
+    def __init__(self, window: int = 20, width: float = 2.0):
+        self.window = window
+        self.width = width
+
+    def output_names(self):
+        return [f"BB{self.window}_upper", f"BB{self.window}_mid", f"BB{self.window}_lower"]
+
+    def compute(self, cols, lo, hi, state):
+        start = max(0, lo - self.window + 1)
+        close = cols["Close"][start:hi]
+        mid = rolling_mean(close, self.window)[lo - start:]
+        band = self.width * rolling_std(close, self.window)[lo - start:]
+        upper, middle, lower = self.output_names()
+        return {upper: mid + band, middle: mid, lower: mid - band}, state
+
+
+class VWAP(Indicator):
+    """Rolling volume weighted average of the typical price (H + L + C) / 3"""
+
+    def __init__(self, window: int = 20):
+        self.window = window
+
+    def output_names(self):
+        return [f"VWAP{self.window}"]
+
+    def compute(self, cols, lo, hi, state):
+        start = max(0, lo - self.window + 1)
+        typical = (cols["High"][start:hi] + cols["Low"][start:hi] + cols["Close"][start:hi]) / 3.0
+        volume = cols["Volume"][start:hi].astype(np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out = rolling_mean(typical * volume, self.window) / rolling_mean(volume, self.window)
+        return {f"VWAP{self.window}": out[lo - start:]}, state
+
+
+INDICATORS = {
+    "sma": SMA,
+    "ema": EMA,
+    "rsi": RSI,
+    "macd": MACD,
+    "bbands": BollingerBands,
+    "vwap": VWAP,
+}
+
+_SPEC_RE = re.compile(r"^([a-z]+)(\d*)$")
+
+
+def parse_indicator(spec: str) -> Indicator:
+    """Build an indicator from a spec such as ``sma20``, ``rsi`` or ``macd``"""
+    match = _SPEC_RE.match(spec.strip().lower())
+    if not match or match.group(1) not in INDICATORS:
+        raise ValueError(f"Unknown indicator: {spec} (expected one of {', '.join(INDICATORS)})")
+    name, window = match.groups()
+    if not window:
+        return INDICATORS[name]()
+    if name == "macd" or int(window) < 1:
+        raise ValueError(f"Invalid indicator window: {spec}")
+    return INDICATORS[name](int(window))
+
+
+class _CachedRun:
+    """Indicator outputs for the first ``n`` bars of a series, plus the state after them"""
+
+    def __init__(self, indicator: Indicator):
+        self.indicator = indicator
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self.first_date = None
+        self.anchor: Tuple = (None, None)
+        self.state = self.indicator.initial_state()
+        self.outputs = {name: np.empty(0) for name in self.indicator.output_names()}
+
+    def matches(self, series: StockSeries) -> bool:
+        """Whether the cached prefix is still identical to the start of ``series``"""
+        if self.n == 0:
+            return True
+        if len(series) < self.n or series.dates[0] != self.first_date:
+            return False
+        return (series.dates[self.n - 1], series.columns["Close"][self.n - 1]) == self.anchor
+
+
+class IndicatorEngine:
+    """Computes indicators over cached series, updating them incrementally.
+
+    Results for all bars but the last are cached per (symbol, indicator)
+    together with the indicator state. When the store appends bars, only the
+    new ones are computed from that state. The last bar is always computed
+    fresh, since the store may still replace it with a later fetch.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._runs: "OrderedDict[Tuple[str, str], _CachedRun]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _run_for(self, key: Tuple[str, str], indicator: Indicator) -> _CachedRun:
+        with self._lock:
+            run = self._runs.get(key)
+            if run is None:
+                run = self._runs[key] = _CachedRun(indicator)
+            self._runs.move_to_end(key)
+            while len(self._runs) > self.max_entries:
+                self._runs.popitem(last=False)
+            return run
+
+    def compute(self, series: StockSeries, specs: List[str]) -> Dict[str, np.ndarray]:
+        """Return every output of ``specs`` over the full series, keyed by column name"""
+        results = {}
+        if not len(series):
+            return results
+        for spec in specs:
+            indicator = parse_indicator(spec)
+            key = (series.symbol, spec.strip().lower())
+            run = self._run_for(key, indicator)
+            with run.lock:
+                results.update(self._advance(run, series))
+        return results
+
+    def _advance(self, run: _CachedRun, series: StockSeries) -> Dict[str, np.ndarray]:
+        cols = series.columns
+        stable = len(series) - 1
+        if not run.matches(series):
+            run.reset()
+        if stable > run.n:
+            outputs, run.state = run.indicator.compute(cols, run.n, stable, run.state)
+            for name, values in outputs.items():
+                run.outputs[name] = np.concatenate([run.outputs[name], values])
+            run.n = stable
+            run.first_date = series.dates[0]
+            run.anchor = (series.dates[stable - 1], cols["Close"][stable - 1])
+        tail, _ = run.indicator.compute(cols, run.n, len(series), run.state)
+        return {name: np.concatenate([run.outputs[name], tail[name]]) for name in run.outputs}
@@ -0,0 +1,93 @@
+import math
+import time
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+
+import numpy as np
+
+
+class QueueFullError(Exception):
+    """Raised when a task is submitted while all workers and queue slots are taken"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Executor is at capacity, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class BoundedExecutor(Executor):
+    """Thread pool with a hard cap on queued work, for slow model calls.
+
+    At most ``max_workers`` tasks run at once and at most ``max_queue`` more
+    wait for a worker. Anything beyond that is rejected immediately with
+    ``QueueFullError`` so the caller can shed load instead of piling up.
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 8, name: str = "llm", window: int = 256):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_times = deque(maxlen=window)
+        self._run_times = deque(maxlen=window)
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        with self._lock:
+            if self._queued + self._running >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise QueueFullError(self._retry_after())
+            self._queued += 1
+        submitted_at = time.monotonic()
+
+        def run():
+            started_at = time.monotonic()
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._wait_times.append(started_at - submitted_at)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+                    self._run_times.append(time.monotonic() - started_at)
+
+        try:
+            return self._pool.submit(run)
+        except Exception:
+            with self._lock:
+                self._queued -= 1
+            raise
+
+    def _retry_after(self) -> int:
+        """Rough number of seconds until a queue slot frees up"""
+        if not self._run_times:
+            return 1
+        mean_run = sum(self._run_times) / len(self._run_times)
+        return max(1, math.ceil(mean_run * (self._queued + 1) / self.max_workers))
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        self._pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            waits = np.array(self._wait_times) if self._wait_times else np.zeros(1)
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queue_depth": self._queued,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "wait_seconds": {
+                    "mean": float(waits.mean()),
+                    "p50": float(np.percentile(waits, 50)),
+                    "p95": float(np.percentile(waits, 95)),
+                    "max": float(waits.max()),
+                },
+            }
@@ -0,0 +1,66 @@
+import re
+import asyncio
+import threading
+from concurrent.futures import Executor
+from typing import AsyncIterator, Callable, Iterable, Iterator, Optional
+
+_CHUNK_RE = re.compile(r"\S+\s*|\s+")
+_DONE = object()
+
+
+def word_chunks(text: str) -> Iterator[str]:
+    """Split ``text`` into words, each keeping its trailing whitespace"""
+    return iter(_CHUNK_RE.findall(text))
+
+
+def sse_frame(data: str) -> str:
+    """Format ``data`` as one Server-Sent Event; newlines become extra data lines"""
+    return "".join(f"data: {line}\n" for line in data.split("\n")) + "\n"
+
+
+def iterate_in_thread(make_iterator: Callable[[], Iterable], executor: Optional[Executor] = None) -> AsyncIterator:
+    """Consume a blocking iterator on a worker thread and yield its items asynchronously.
+
+    The worker is submitted right away, so an executor that rejects work
+    raises here, before any response has been started. The event loop only
+    awaits a queue, so other requests keep being served while the worker
+    blocks on the model. If the consumer goes away (e.g. the client
+    disconnects) the worker stops after its current item.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            # The loop was closed while the worker was still running
+            stop.set()
+
+    def produce():
+        try:
+            for item in make_iterator():
+                if stop.is_set():
+                    break
+                put(item)
+        except Exception as e:
+            put(e)
+        finally:
+            put(_DONE)
+
+    loop.run_in_executor(executor, produce)
+
+    async def drain():
+        try:
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+
+    return drain()
@@ -1,15 +1,40 @@
 import os
+import asyncio
 import logging
-import json
-from datetime import datetime
-from typing import List, Optional
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from datetime import date, datetime
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from typing import Iterator, List, Optional
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from google.cloud import aiplatform
 from google.cloud import firestore
 from pydantic import BaseModel
-import yfinance as yf
 from vertexai.preview.agent import AgentBuilder
+from stock_store import PRICE_COLUMNS, StockStore, validate_period, window_start
+from symbol_registry import SymbolRegistry
+from firestore_writer import WriteBehindQueue
+from stock_bars import StockBarRepository
+from indicators import IndicatorEngine
+from downsample import downsample
+from response_encoding import columnar_response, negotiate_encoding, negotiate_media_type
+from http_cache import cache_headers, etag_matches, make_etag, not_modified
+from agent_pool import AgentPool
+from conversation_store import ConversationStore
+from context_window import ContextWindow
+from response_cache import ResponseCache
+from llm_executor import BoundedExecutor, QueueFullError
+from llm_streaming import iterate_in_thread, sse_frame, word_chunks
+from singleflight import SingleFlight
+from news_index import NewsIndex
+from search_index import SearchIndex
+from health_store import HealthStore
+from health_rollups import METRIC_BUCKET_WIDTHS, parse_sync_time
+from run_history import RunHistoryReader
+from task_queue import TaskQueue
+from task_workers import init_worker
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -53,6 +78,7 @@ except Exception as e:
 
 # Ensure data directories exist
 os.makedirs(f"{DATA_DIR}/news", exist_ok=True)
+os.makedirs(f"{DATA_DIR}/papers", exist_ok=True)
 os.makedirs(f"{DATA_DIR}/health", exist_ok=True)
 os.makedirs(f"{DATA_DIR}/stocks", exist_ok=True)
 os.makedirs(MODEL_PATH, exist_ok=True)
@@ -65,15 +91,70 @@ else:
     firestore_client = firestore.Client()
 logger.info(f"Using Firestore host: {FIRESTORE_HOST or 'production'}")
 
+# Stock bars are written behind the request, in batches, by a background worker
+FIRESTORE_FLUSH_INTERVAL = float(os.environ.get("FIRESTORE_FLUSH_INTERVAL", 2.0))
+firestore_writer = WriteBehindQueue(firestore_client, flush_interval=FIRESTORE_FLUSH_INTERVAL)
+stock_bars = StockBarRepository(firestore_client, firestore_writer)
+
+# Local OHLCV cache; bars are refetched from upstream at most every STOCK_CACHE_TTL seconds
+STOCK_CACHE_TTL = float(os.environ.get("STOCK_CACHE_TTL", 300))
+stock_store = StockStore(f"{DATA_DIR}/stocks", ttl=STOCK_CACHE_TTL)
+
+# Bounded worker pool for upstream stock fetches, shared by the batch endpoint
+STOCK_FETCH_WORKERS = int(os.environ.get("STOCK_FETCH_WORKERS", 8))
+STOCK_BATCH_MAX_SYMBOLS = int(os.environ.get("STOCK_BATCH_MAX_SYMBOLS", 100))
+stock_executor = ThreadPoolExecutor(max_workers=STOCK_FETCH_WORKERS, thread_name_prefix="stocks")
+
+# Cache-Control max-age (seconds) sent along with ETags on read endpoints
+HTTP_CACHE_MAX_AGE = int(os.environ.get("HTTP_CACHE_MAX_AGE", 30))
+
+# Technical indicators, updated incrementally as the stock cache grows
+indicator_engine = IndicatorEngine()
+
+# Symbol metadata registry, warmed at startup for the configured watchlist
+STOCK_WATCHLIST = [s.strip() for s in os.environ.get("STOCK_WATCHLIST", "7974.T").split(",") if s.strip()]
+SYMBOL_METADATA_TTL = float(os.environ.get("SYMBOL_METADATA_TTL", 7 * 24 * 3600))
+symbol_registry = SymbolRegistry(f"{DATA_DIR}/stocks/symbols.json", ttl=SYMBOL_METADATA_TTL, executor=stock_executor)
+
+# News files are indexed in memory; the directory is rescanned at most every NEWS_RESCAN_INTERVAL seconds
+NEWS_RESCAN_INTERVAL = float(os.environ.get("NEWS_RESCAN_INTERVAL", 5))
+NEWS_PAGE_MAX = int(os.environ.get("NEWS_PAGE_MAX", 200))
+news_index = NewsIndex(f"{DATA_DIR}/news", rescan_interval=NEWS_RESCAN_INTERVAL)
+papers_index = NewsIndex(f"{DATA_DIR}/papers", rescan_interval=NEWS_RESCAN_INTERVAL)
+
+# Health samples are stored per user, with a pointer to the latest one
+health_store = HealthStore(f"{DATA_DIR}/health")
+
+# Scheduler run history, written by the scheduler into one SQLite database
+run_history = RunHistoryReader(f"{DATA_DIR}/runs.sqlite3")
+
+# Background tasks are tracked in SQLite and run in separate (spawned) worker processes;
+# the server is started by serve.py so that the workers do not re-run this module
+TASK_WORKERS = int(os.environ.get("TASK_WORKERS", 2))
+task_executor = ProcessPoolExecutor(max_workers=TASK_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                                    initializer=init_worker)
+task_queue = TaskQueue(f"{DATA_DIR}/tasks.sqlite3", task_executor)
+
+# Full-text search over news and papers, kept up to date file by file as the indexes rescan
+SEARCH_PAGE_MAX = int(os.environ.get("SEARCH_PAGE_MAX", 100))
+search_index = SearchIndex()
+news_index.subscribe(lambda name, items: search_index.replace_file("news", name, items))
+papers_index.subscribe(lambda name, items: search_index.replace_file("papers", name, items))
+
 # API Models
 class ChatMessage(BaseModel):
     message: str
     user_id: str = "default_user"
+    # Set to False to always ask the model, bypassing the response cache
+    use_cache: bool = True
+    # Continue a stored conversation; without it a new one is started from ``history``
+    conversation_id: Optional[str] = None
     history: Optional[List[dict]] = []
 
 class ChatResponse(BaseModel):
     response: str
     timestamp: str
+    conversation_id: Optional[str] = None
 
 class NewsItem(BaseModel):
     title: str
@@ -82,29 +163,169 @@ class NewsItem(BaseModel):
     url: Optional[str] = None
     date: str
 
+class SearchHit(NewsItem):
+    type: str
+    score: float
+
+class SymbolInfo(BaseModel):
+    symbol: str
+    name: str
+    exchange: Optional[str] = None
+    currency: Optional[str] = None
+    timezone: Optional[str] = None
+    updated_at: float
+
 class HealthData(BaseModel):
     steps: int
     sleep_hours: float
     heart_rate: int
     last_sync: str
 
+# Chat history lives on the server; clients send only the new message and a conversation ID
+CONVERSATION_CACHE_SIZE = int(os.environ.get("CONVERSATION_CACHE_SIZE", 1000))
+conversation_store = ConversationStore(f"{DATA_DIR}/conversations", max_cached=CONVERSATION_CACHE_SIZE)
+
 # AI interaction function - always use Vertex AI Agent Builder
-def get_llm_response(message: str, history: List[dict], user_id: str) -> str:
-    """Get response from Vertex AI Agent Builder with error handling"""
-    try:
-        agent = AgentBuilder()\
-            .set_agent_id(AGENT_ID)\
-            .set_chat_model("chat-bison@001")\
-            .build()
+CHAT_MODEL = "chat-bison@001"
+LLM_FALLBACK_RESPONSE = "Sorry, I couldn't process your request."
+
+def build_agent():
+    return AgentBuilder()\
+        .set_agent_id(AGENT_ID)\
+        .set_chat_model(CHAT_MODEL)\
+        .build()
+
+def check_agent(agent) -> bool:
+    """Health check for pooled agents: a minimal prompt must get a non-empty answer"""
+    return bool(agent.run([{"author": "user", "content": "ping"}]).content)
+
+# Long-lived agent clients, built once at startup and shared by all chat requests;
+# each is health-checked when built and again after AGENT_CHECK_INTERVAL seconds
+AGENT_POOL_SIZE = int(os.environ.get("AGENT_POOL_SIZE", 4))
+AGENT_MAX_AGE = float(os.environ.get("AGENT_MAX_AGE", 3600))
+AGENT_CHECK_INTERVAL = float(os.environ.get("AGENT_CHECK_INTERVAL", 300))
+AGENT_ACQUIRE_TIMEOUT = float(os.environ.get("AGENT_ACQUIRE_TIMEOUT", 30))
+agent_pool = AgentPool(build_agent, size=AGENT_POOL_SIZE, max_age=AGENT_MAX_AGE,
+                       health_check=check_agent, check_interval=AGENT_CHECK_INTERVAL)
+
+# Model calls run on their own bounded pool; when it is full, chat requests get a 429
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", AGENT_POOL_SIZE))
+LLM_MAX_QUEUE = int(os.environ.get("LLM_MAX_QUEUE", 8))
+llm_executor = BoundedExecutor(max_workers=LLM_MAX_CONCURRENCY, max_queue=LLM_MAX_QUEUE, name="llm")
+
+def build_agent_messages(message: str, history: List[dict]) -> List[dict]:
+    msgs = [{"author": item.get("role"), "content": item.get("content")} for item in history or []]
+    msgs.append({"author": "user", "content": message})
+    return msgs
+
+def summarize_history(previous_summary: str, messages: List[dict]) -> str:
+    """Fold ``messages`` into the running summary of a conversation using the agent"""
+    transcript = "\n".join(f"{m.get('role')}: {m.get('content')}" for m in messages)
+    prompt = (
+        "Update the running summary of this conversation. Keep names, facts, preferences and "
+        "open questions; answer with the summary only, in at most a few short paragraphs.\n\n"
+        f"Current summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"
+    )
+    with agent_pool.acquire(timeout=AGENT_ACQUIRE_TIMEOUT) as agent:
+        return agent.run([{"author": "user", "content": prompt}]).content
+
+# Recent turns are sent verbatim within a token budget; older ones as a rolling summary
+CHAT_HISTORY_MAX_MESSAGES = int(os.environ.get("CHAT_HISTORY_MAX_MESSAGES", 20))
+CHAT_HISTORY_TOKEN_BUDGET = int(os.environ.get("CHAT_HISTORY_TOKEN_BUDGET", 2000))
+CHAT_SUMMARY_MAX_TOKENS = int(os.environ.get("CHAT_SUMMARY_MAX_TOKENS", 400))
+context_window = ContextWindow(
+    conversation_store,
+    summarize_history,
+    max_messages=CHAT_HISTORY_MAX_MESSAGES,
+    token_budget=CHAT_HISTORY_TOKEN_BUDGET,
+    summary_max_tokens=CHAT_SUMMARY_MAX_TOKENS,
+)
 
-        msgs = [{"author": item.get("role"), "content": item.get("content")} for item in history or []]
-        msgs.append({"author": "user", "content": message})
+# Answers to repeated prompts with the same context sent to the model are served from memory
+LLM_CACHE_SIZE = int(os.environ.get("LLM_CACHE_SIZE", 1024))
+LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", 3600))
+response_cache = ResponseCache(max_entries=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL)
 
-        result = agent.run(msgs)
-        return result.content
-    except Exception as e:
-        logger.error(f"Agent call failed for user {user_id}: {str(e)}")
-        return "Sorry, I couldn't process your request."
+# Identical prompts arriving while the first is still being answered wait for that answer
+llm_flight = SingleFlight("llm")
+
+def response_cache_key(message: ChatMessage, history: List[dict]) -> Optional[str]:
+    """Cache key of ``message`` asked with ``history``, the windowed history sent to the model"""
+    if not message.use_cache:
+        return None
+    return response_cache.key(message.message, history, AGENT_ID or "", CHAT_MODEL)
+
+async def windowed_history(conversation) -> List[dict]:
+    """History for the next turn, built on the LLM pool since it may summarize with the agent.
+
+    Raises QueueFullError when the pool is full; once admitted, a new
+    conversation is stored, so its ID can be returned to the client.
+    """
+    history = await asyncio.wrap_future(llm_executor.submit(context_window.build, conversation))
+    conversation_store.persist(conversation)
+    return history
+
+def get_llm_response(message: str, history: List[dict], user_id: str) -> str:
+    """Get response from Vertex AI Agent Builder; a failed call raises"""
+    with agent_pool.acquire(timeout=AGENT_ACQUIRE_TIMEOUT) as agent:
+        result = agent.run(build_agent_messages(message, history))
+    return result.content
+
+def stream_llm_response(message: str, history: List[dict], user_id: str) -> Iterator[str]:
+    """Yield the response text chunk by chunk as the agent produces it.
+
+    Agents without a ``stream`` method are run to completion and their
+    answer is yielded word by word. A failed call raises, possibly after
+    some chunks have already been yielded.
+    """
+    msgs = build_agent_messages(message, history)
+    with agent_pool.acquire(timeout=AGENT_ACQUIRE_TIMEOUT) as agent:
+        if hasattr(agent, "stream"):
+            for chunk in agent.stream(msgs):
+                text = getattr(chunk, "content", chunk)
+                if text:
+                    yield text
+            return
+        text = agent.run(msgs).content
+    yield from word_chunks(text)
+
+@app.on_event("startup")
+def warm_agent_pool():
+    agent_pool.warm()
+
+@app.on_event("startup")
+def start_firestore_writer():
+    firestore_writer.start()
+
+@app.on_event("startup")
+def recover_tasks():
+    task_queue.recover()
+
+@app.on_event("shutdown")
+def stop_task_executor():
+    task_executor.shutdown(wait=False, cancel_futures=True)
+
+@app.on_event("shutdown")
+def stop_llm_executor():
+    llm_executor.shutdown(wait=False, cancel_futures=True)
+
+@app.on_event("shutdown")
+def stop_firestore_writer():
+    """Flush queued Firestore writes before the process exits"""
+    logger.info("Flushing pending Firestore writes")
+    firestore_writer.close()
+
+@app.on_event("startup")
+def import_legacy_health_data():
+    """Samples written before health data was partitioned belonged to the default user"""
+    health_store.import_legacy("default_user")
+
+@app.on_event("startup")
+def warm_symbol_registry():
+    """Load metadata for the watchlist in the background so startup is not delayed"""
+    logger.info(f"Warming symbol metadata for watchlist: {STOCK_WATCHLIST}")
+    for symbol in STOCK_WATCHLIST:
+        stock_executor.submit(symbol_registry.warm, [symbol])
 
 # API Routes
 @app.get("/")
@@ -115,176 +336,480 @@ def read_root():
         "status": "operational"
     }
 
+def too_busy(e: QueueFullError) -> HTTPException:
+    return HTTPException(status_code=429, detail="Too many chat requests in progress",
+                         headers={"Retry-After": str(e.retry_after)})
+
+def resolve_conversation(message: ChatMessage):
+    """Return the stored conversation for ``message``, starting one if it has no ID.
+
+    A new conversation is only written once ``windowed_history`` has admitted
+    the request, so a 429 leaves no orphan behind for every client retry.
+    """
+    if not message.conversation_id:
+        return conversation_store.new(message.user_id, message.history or [])
+    conversation = conversation_store.get(message.conversation_id)
+    if conversation is None or conversation.user_id != message.user_id:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return conversation
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(message: ChatMessage):
     try:
         logger.info(f"Received message from {message.user_id}: {message.message}")
+        conversation = resolve_conversation(message)
+        try:
+            history = await windowed_history(conversation)
+        except QueueFullError as e:
+            logger.warning(f"Rejecting chat from {message.user_id}: {e}")
+            raise too_busy(e)
+        cache_key = response_cache_key(message, history)
+        response = response_cache.get(cache_key) if cache_key else None
         
-        # Get response from LLM with history
-        response = get_llm_response(message.message, message.history, message.user_id)
+        if response is None:
+            # Get response from LLM with the windowed history, off the event loop
+            async def ask_llm():
+                future = llm_executor.submit(get_llm_response, message.message, history, message.user_id)
+                response = await asyncio.wrap_future(future)
+                if cache_key:
+                    response_cache.put(cache_key, response)
+                return response
+
+            try:
+                if cache_key:
+                    response = await llm_flight.do_async(cache_key, ask_llm)
+                else:
+                    response = await ask_llm()
+            except QueueFullError as e:
+                logger.warning(f"Rejecting chat from {message.user_id}: {e}")
+                raise too_busy(e)
+            except Exception as e:
+                # Neither cached nor recorded in the conversation, so the turn can simply be retried
+                logger.error(f"Agent call failed for user {message.user_id}: {str(e)}")
+                return ChatResponse(
+                    response=LLM_FALLBACK_RESPONSE,
+                    timestamp=datetime.now().isoformat(),
+                    conversation_id=conversation.id
+                )
+        else:
+            logger.info(f"Answered {message.user_id} from the response cache")
         
         # Log the response
         logger.info(f"Response for {message.user_id}: {response}")
+        conversation_store.append(conversation, [
+            {"role": "user", "content": message.message},
+            {"role": "assistant", "content": response},
+        ])
         
         return ChatResponse(
             response=response,
-            timestamp=datetime.now().isoformat()
+            timestamp=datetime.now().isoformat(),
+            conversation_id=conversation.id
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in chat endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/chat/stream")
 async def chat_stream_endpoint(message: ChatMessage):
-    """Stream AI response as Server-Sent Events (SSE)"""
-    from fastapi.responses import StreamingResponse
-    import time
+    """Stream AI response as Server-Sent Events (SSE)
+
+    The conversation ID is returned in the ``X-Conversation-Id`` header.
+    """
+    conversation = resolve_conversation(message)
+    try:
+        history = await windowed_history(conversation)
+    except QueueFullError as e:
+        logger.warning(f"Rejecting chat stream from {message.user_id}: {e}")
+        raise too_busy(e)
+    cache_key = response_cache_key(message, history)
+    cached = response_cache.get(cache_key) if cache_key else None
+
+    async def replay(text):
+        for chunk in word_chunks(text):
+            yield chunk
+
+    if cached is not None:
+        chunks = replay(cached)
+    else:
+        # The agent runs on the LLM pool; chunks are forwarded as they arrive
+        try:
+            chunks = iterate_in_thread(
+                lambda: stream_llm_response(message.message, history, message.user_id),
+                executor=llm_executor,
+            )
+        except QueueFullError as e:
+            logger.warning(f"Rejecting chat stream from {message.user_id}: {e}")
+            raise too_busy(e)
 
     async def event_generator():
-        # Get full response synchronously
-        response_text = get_llm_response(message.message, message.history, message.user_id)
-        # Stream character by character
-        for char in response_text:
-            yield f"data: {char}\n\n"
-            time.sleep(0.01)
+        parts = []
+        failed = False
+        try:
+            async for chunk in chunks:
+                parts.append(chunk)
+                yield sse_frame(chunk)
+        except Exception as e:
+            logger.error(f"Agent stream failed for user {message.user_id}: {str(e)}")
+            failed = True
+            yield sse_frame(LLM_FALLBACK_RESPONSE)
+        if not failed:
+            # A partial answer is neither cached nor recorded in the conversation
+            response = "".join(parts)
+            if cache_key and cached is None:
+                response_cache.put(cache_key, response)
+            conversation_store.append(conversation, [
+                {"role": "user", "content": message.message},
+                {"role": "assistant", "content": response},
+            ])
         # Signal end of stream
         yield 'data: [DONE]\n\n'
 
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    return StreamingResponse(event_generator(), media_type="text/event-stream",
+                             headers={"X-Conversation-Id": conversation.id})
+
+@app.get("/metrics")
+async def get_metrics():
+    """Internal counters: LLM queue depth and wait times, agent pool usage, caches, coalesced calls"""
+    return {
+        "llm_executor": llm_executor.metrics(),
+        "agent_pool": agent_pool.stats(),
+        "llm_cache": response_cache.stats(),
+        "singleflight": {flight.name: flight.stats() for flight in (
+            llm_flight, news_index.flight, papers_index.flight, stock_store.flight, symbol_registry.flight)},
+    }
+
+
+@app.get("/runs")
+def get_runs(job: Optional[str] = None, status: Optional[str] = None,
+             since: Optional[float] = None, limit: int = 50):
+    """Recent scheduler runs, newest first, filtered by job name, status and start time (unix seconds)"""
+    if not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000")
+    try:
+        return run_history.query(job=job, status=status, since=since, limit=limit)
+    except Exception as e:
+        logger.error(f"Error reading run history: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/news", response_model=List[NewsItem])
-async def get_news():
+async def get_news(request: Request, response: Response, limit: int = 50,
+                   cursor: Optional[str] = None, since: Optional[str] = None):
+    """News items, newest first.
+
+    At most ``limit`` items are returned; when more remain, the
+    ``X-Next-Cursor`` header holds the ``cursor`` for the next page.
+    ``since`` (an ISO date or timestamp) drops items dated earlier.
+    """
+    if not 1 <= limit <= NEWS_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {NEWS_PAGE_MAX}")
     try:
-        news_dir = f"{DATA_DIR}/news"
-        files = sorted([f for f in os.listdir(news_dir) if f.endswith('.json')])
-        news_items = []
-        for file in files:
-            with open(os.path.join(news_dir, file)) as fp:
-                data = json.load(fp)
-                news_items.extend(data if isinstance(data, list) else [data])
+        # Picks up new or changed files only, and at most every NEWS_RESCAN_INTERVAL seconds
+        await asyncio.get_running_loop().run_in_executor(None, news_index.refresh)
+        etag = make_etag("news", news_index.version, limit, cursor, since)
+        if etag_matches(request, etag):
+            return not_modified(etag, HTTP_CACHE_MAX_AGE)
+        try:
+            news_items, next_cursor = news_index.page(limit, cursor, since)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        response.headers.update(cache_headers(etag, HTTP_CACHE_MAX_AGE))
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         return news_items
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching news: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/search", response_model=List[SearchHit])
+async def search(q: str, response: Response, type: Optional[str] = None, limit: int = 20, offset: int = 0):
+    """News and papers matching ``q``, best match first (BM25).
+
+    ``type`` restricts hits to ``news`` or ``papers``; the total number of
+    matches is returned in the ``X-Total-Count`` header.
+    """
+    if type not in (None, "news", "papers"):
+        raise HTTPException(status_code=400, detail="type must be 'news' or 'papers'")
+    if not 1 <= limit <= SEARCH_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {SEARCH_PAGE_MAX}")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="offset must not be negative")
+    try:
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(loop.run_in_executor(None, news_index.refresh),
+                             loop.run_in_executor(None, papers_index.refresh))
+        hits, total = search_index.search(q, limit, offset, collection=type)
+        response.headers["X-Total-Count"] = str(total)
+        return [SearchHit(**item, type=collection, score=round(score, 4)) for score, collection, item in hits]
+    except Exception as e:
+        logger.error(f"Error searching for {q!r}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/health", response_model=HealthData)
-async def get_health_data(user_id: str = "default_user"):
+def get_health_data(request: Request, response: Response, user_id: str = "default_user"):
+    """Latest health sample of ``user_id``"""
     try:
-        health_dir = f"{DATA_DIR}/health"
-        files = sorted([f for f in os.listdir(health_dir) if f.endswith('.json')])
-        if not files:
+        try:
+            latest = health_store.latest(user_id)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if latest is None:
             raise HTTPException(status_code=404, detail="No health data found")
-        latest_file = files[-1]
-        with open(os.path.join(health_dir, latest_file)) as fp:
-            data = json.load(fp)
-        return HealthData(**data)
+        etag = make_etag("health", user_id, latest["seq"])
+        if etag_matches(request, etag):
+            return not_modified(etag, HTTP_CACHE_MAX_AGE)
+        response.headers.update(cache_headers(etag, HTTP_CACHE_MAX_AGE))
+        return HealthData(**latest["sample"])
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching health data: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/health/series")
+def get_health_series(request: Request, response: Response, user_id: str = "default_user",
+                      start: Optional[date] = None, end: Optional[date] = None,
+                      granularity: str = "day", metrics: Optional[str] = None,
+                      percentiles: str = "50,90"):
+    """Daily or weekly aggregates of ``user_id``'s health samples between ``start`` and ``end``.
+
+    Each period reports count, sum, mean, min, max and the requested
+    ``percentiles`` for every metric in ``metrics`` (all by default). Weeks
+    start on Monday and are keyed by that date.
+    """
+    try:
+        try:
+            latest = health_store.latest(user_id)
+            metric_names = [m.strip() for m in (metrics or ",".join(METRIC_BUCKET_WIDTHS)).split(",") if m.strip()]
+            quantiles = [float(q) for q in percentiles.split(",") if q.strip()]
+            etag = make_etag("health-series", user_id, latest["seq"] if latest else 0, start, end,
+                             granularity, metric_names, quantiles)
+            if etag_matches(request, etag):
+                return not_modified(etag, HTTP_CACHE_MAX_AGE)
+            series = health_store.rollups(user_id).series(granularity, start, end, metric_names, quantiles)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        response.headers.update(cache_headers(etag, HTTP_CACHE_MAX_AGE))
+        return {"user_id": user_id, "granularity": granularity, "series": series}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching health series for {user_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/health", response_model=HealthData)
+def post_health_data(data: HealthData, user_id: str = "default_user"):
+    """Record a new health sample for ``user_id``; ``last_sync`` decides the day it is rolled up under"""
+    try:
+        parse_sync_time(data.last_sync)
+        health_store.append(user_id, data.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error storing health data for {user_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return data
+
+def persist_stock_bars(series):
+    """Upsert bars not yet in Firestore; runs off the request path"""
+    try:
+        stock_bars.upsert(series)
+    except Exception as e:
+        logger.error(f"Error queueing stock bars for {series.symbol} for Firestore: {e}")
+
+def load_stock_series(symbol: str, period: str):
+    """Return the cached bars of ``symbol`` (covering ``period``) and its company name"""
+    # Serve from the local cache, fetching only bars newer than the last cached one
+    series = stock_store.get(symbol, period)
+    stock_executor.submit(persist_stock_bars, series)
+    logger.info(f"Loaded {len(series)} bars for {symbol} (last: {series.last_date})")
+
+    # Get company name from the metadata registry rather than stock.info
+    try:
+        company_name = symbol_registry.get(symbol)["name"]
+    except Exception as e:
+        logger.error(f"Error looking up metadata for {symbol}: {e}")
+        company_name = symbol
+    return series, company_name
+
+@app.get("/stocks/symbols", response_model=List[SymbolInfo])
+async def list_symbols():
+    """List the metadata of every symbol known to the registry"""
+    return list(symbol_registry.all().values())
+
+@app.get("/stocks/symbols/{symbol}", response_model=SymbolInfo)
+def get_symbol(symbol: str, refresh: bool = False):
+    try:
+        return symbol_registry.refresh(symbol) if refresh else symbol_registry.get(symbol)
+    except Exception as e:
+        logger.error(f"Error fetching metadata for {symbol}: {str(e)}")
+        raise HTTPException(status_code=502, detail=str(e))
+
+@app.get("/stocks/batch")
+async def get_stock_batch(request: Request, symbols: str, period: str = "1mo"):
+    """Fetch several symbols concurrently and return them as one columnar payload.
+
+    Rows of all symbols are concatenated; the ``Symbol`` column says which
+    symbol each row belongs to. Symbols that fail are reported in ``Errors``
+    instead of failing the whole batch. Like /stocks, the payload can be
+    requested as msgpack or Arrow via the Accept header.
+    """
+    symbol_list = list(dict.fromkeys(s.strip() for s in symbols.split(",") if s.strip()))
+    if not symbol_list:
+        raise HTTPException(status_code=400, detail="No symbols given")
+    if len(symbol_list) > STOCK_BATCH_MAX_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"At most {STOCK_BATCH_MAX_SYMBOLS} symbols per batch")
+    try:
+        validate_period(period)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"Fetching stock batch of {len(symbol_list)} symbols with period: {period}")
+
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(
+        *(loop.run_in_executor(stock_executor, load_stock_series, symbol, period) for symbol in symbol_list),
+        return_exceptions=True,
+    )
+
+    loaded = []
+    names = {}
+    errors = {}
+    for symbol, result in zip(symbol_list, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error fetching stock data for {symbol}: {result}")
+            errors[symbol] = str(result)
+            continue
+        series, names[symbol] = result
+        loaded.append(series.window(period))
+
+    columns = {"Symbol": [series.symbol for series in loaded for _ in range(len(series))]}
+    if loaded:
+        columns["Date"] = np.concatenate([series.dates for series in loaded])
+        for col in PRICE_COLUMNS:
+            columns[col] = np.concatenate([series.columns[col] for series in loaded])
+    else:
+        columns["Date"] = np.array([], dtype="datetime64[D]")
+        columns.update({col: np.array([]) for col in PRICE_COLUMNS})
+    return columnar_response(request, columns, {"Names": names, "Errors": errors})
+
+@app.get("/stocks/history")
+def get_stock_history(symbol: str, start: Optional[str] = None, end: Optional[str] = None,
+                      fields: Optional[str] = None):
+    """Read stored bars of ``symbol`` back from Firestore for a date range.
+
+    ``start`` and ``end`` are inclusive YYYY-MM-DD dates; ``fields`` is a
+    comma separated subset of Open, High, Low, Close and Volume.
+    """
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    try:
+        return stock_bars.read(symbol, start=start, end=end, fields=field_list)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error reading stock history for {symbol}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/stocks")
-async def get_stock_data(symbol: str = "7974.T", period: str = "1mo"):
+async def get_stock_data(request: Request, symbol: str = "7974.T", period: str = "1mo",
+                         indicators: Optional[str] = None, max_points: Optional[int] = None,
+                         downsample_method: str = "ohlc"):
+    """Daily bars of ``symbol`` for ``period``.
+
+    ``indicators`` is a comma separated list of specs such as
+    ``sma20,ema50,rsi14,macd,bbands20,vwap20``; each adds its columns to
+    the response. They are computed over the whole cached history, so the
+    first bars of the period have values whenever earlier bars are cached.
+
+    With ``max_points`` the bars are downsampled on the server, either by
+    merging them into OHLC buckets (``ohlc``, the default) or by keeping
+    the bars Largest-Triangle-Three-Buckets picks on the close (``lttb``).
+
+    JSON is returned by default; clients can ask for typed msgpack arrays
+    or an Arrow IPC stream via the Accept header, and for zstd or gzip
+    compression via Accept-Encoding.
+    """
     # Fetch and process stock data
     logger.info(f"Fetching stock data for symbol: {symbol} with period: {period}")
+    vary = "Accept, Accept-Encoding"
+    media_type, encoding = negotiate_media_type(request), negotiate_encoding(request)
+
+    def stock_etag(series, company_name):
+        return make_etag("stocks", period, indicators, max_points, downsample_method,
+                         series.version, company_name, media_type, encoding)
+
     try:
-        # Use yfinance to get real stock data
-        stock = yf.Ticker(symbol)
-        hist = stock.history(period=period)
-        logger.info(f"Fetched stock data for {symbol}: {hist.head()}")
-
-        # Reset index to make date a column
-        hist.reset_index(inplace=True)
-
-        # Convert datetime to string for JSON serialization
-        hist['Date'] = hist['Date'].dt.strftime('%Y-%m-%d')
-
-        # # Add moving averages
-        # hist['MA5'] = hist['Close'].rolling(window=5).mean()
-        # hist['MA20'] = hist['Close'].rolling(window=20).mean()
-
-        # # Replace inf/-inf with 0 and fill NaNs with 0 for JSON compliance
-        # hist = hist.replace([float('inf'), float('-inf')], 0).fillna(0)
-
-        # Get company name
-        info = stock.info
-        company_name = info.get('shortName', symbol)
-
-        # Convert to dict for JSON response
-        data = {
-            "Date": hist['Date'].tolist(),
-            "Open": hist['Open'].tolist(),
-            "High": hist['High'].tolist(),
-            "Low": hist['Low'].tolist(),
-            "Close": hist['Close'].tolist(),
-            "Volume": hist['Volume'].tolist(),
-            # "MA5": hist['MA5'].tolist(),
-            # "MA20": hist['MA20'].tolist(),
-            "Symbol": symbol,
-            "Name": company_name
-        }
-        # Persist to Firestore
+        # Answer revalidations from memory, without touching yfinance or the disk
         try:
-            firestore_client.collection("stocks").add({
-                "symbol": symbol,
-                "timestamp": datetime.utcnow().isoformat(),
-                "data": data
-            })
-            logger.info(f"Stored stock data for {symbol} to Firestore")
-        except Exception as e:
-            logger.error(f"Error writing stock data to Firestore: {e}")
-        logger.info(f"Fetched stock data for {symbol}: {data}")
-        return data
+            cached, entry = stock_store.peek(symbol, period), symbol_registry.peek(symbol)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if cached is not None and entry is not None:
+            etag = stock_etag(cached, entry["name"])
+            if etag_matches(request, etag):
+                return not_modified(etag, HTTP_CACHE_MAX_AGE, vary)
+
+        try:
+            # Off the event loop, so concurrent requests for a symbol can share one upstream fetch
+            loop = asyncio.get_running_loop()
+            full_series, company_name = await loop.run_in_executor(stock_executor, load_stock_series, symbol, period)
+            etag = stock_etag(full_series, company_name)
+            if etag_matches(request, etag):
+                return not_modified(etag, HTTP_CACHE_MAX_AGE, vary)
+            specs = [spec for spec in (indicators or "").split(",") if spec.strip()]
+            indicator_values = indicator_engine.compute(full_series, specs)
+            start = window_start(full_series, period)
+            series = full_series.window(period)
+            columns = {"Date": series.dates, **series.columns}
+            columns.update({name: values[start:] for name, values in indicator_values.items()})
+            if max_points is not None:
+                columns = downsample(columns, max_points, downsample_method)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        logger.info(f"Fetched stock data for {symbol}: {len(columns['Date'])} of {len(series)} bars")
+        return columnar_response(request, columns, {"Symbol": symbol, "Name": company_name},
+                                 headers=cache_headers(etag, HTTP_CACHE_MAX_AGE))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching stock data: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/tasks/fetch-news")
-async def fetch_news_task(background_tasks: BackgroundTasks):
+class TaskStatus(BaseModel):
+    id: str
+    kind: str
+    args: dict
+    status: str
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+
+def submit_task(kind: str, response: Response) -> TaskStatus:
+    """Queue ``kind``, or return the identical task already queued or running"""
+    task, created = task_queue.submit(kind)
+    response.status_code = 202 if created else 200
+    response.headers["Location"] = f"/tasks/{task['id']}"
+    return TaskStatus(**task)
+
+@app.post("/tasks/fetch-news", response_model=TaskStatus)
+def fetch_news_task(response: Response):
     """Endpoint to trigger news fetching, designed to be called by Cloud Scheduler"""
-    background_tasks.add_task(fetch_news_background)
-    return {"status": "News fetch task scheduled"}
+    return submit_task("fetch-news", response)
 
-@app.post("/tasks/fetch-papers")
-async def fetch_papers_task(background_tasks: BackgroundTasks):
+@app.post("/tasks/fetch-papers", response_model=TaskStatus)
+def fetch_papers_task(response: Response):
     """Endpoint to trigger research papers fetching, designed to be called by Cloud Scheduler"""
-    background_tasks.add_task(fetch_papers_background)
-    return {"status": "Research papers fetch task scheduled"}
-
-# Background tasks
-def fetch_news_background():
-    """Task to fetch and store latest AI news"""
-    logger.info("Fetching AI news in background")
-    # In production, this would use a real news API
-    # For now, just log that it ran
-    logger.info("News fetch completed")
-
-def fetch_papers_background():
-    """Task to fetch and store latest research papers"""
-    logger.info("Fetching research papers in background")
-    # In production, this would use an academic paper API
-    # For now, just log that it ran
-    logger.info("Research papers fetch completed")
-
-# Run the application
-if __name__ == "__main__":
-    import uvicorn
-    import sys
-    
-    # More detailed logging for startup
-    logger.info("Starting API service")
-    logger.info(f"Python version: {sys.version}")
-    logger.info(f"Current working directory: {os.getcwd()}")
-    logger.info(f"Environment: {ENVIRONMENT}")
-    
-    # Get the port from environment variable
-    port = int(os.environ.get("PORT", 8080))
-    logger.info(f"Port configuration: Using port {port} (from environment: {os.environ.get('PORT')})")
-    
-    try:
-        logger.info(f"Starting server on port {port}")
-        uvicorn.run(app, host="0.0.0.0", port=port)
-    except Exception as e:
-        logger.error(f"Failed to start server: {str(e)}")
-        # Print to stderr as well for Cloud Run logs
-        print(f"ERROR: Failed to start server: {str(e)}", file=sys.stderr)
-        raise
\ No newline at end of file
+    return submit_task("fetch-papers", response)
+
+@app.get("/tasks/{task_id}", response_model=TaskStatus)
+def get_task(task_id: str):
+    task = task_queue.get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return TaskStatus(**task)
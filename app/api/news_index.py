@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import base64
+import hashlib
+import bisect
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Fields every news item has; files whose entries lack them (e.g. fetch logs) are skipped
+NEWS_FIELDS = ("title", "summary", "source", "date")
+
+# (date, file name, position in file): unique and stable for a given file
+SortKey = Tuple[str, str, int]
+
+
+def encode_cursor(key: SortKey) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> SortKey:
+    try:
+        date, name, position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(date), str(name), int(position)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _is_news_item(entry) -> bool:
+    return isinstance(entry, dict) and all(isinstance(entry.get(f), str) for f in NEWS_FIELDS)
+
+
+def _read_items(path: str) -> List[dict]:
+    with open(path) as fp:
+        data = json.load(fp)
+    entries = data if isinstance(data, list) else [data]
+    return [entry for entry in entries if _is_news_item(entry)]
+
+
+def _read_lines(path: str, offset: int) -> Tuple[List[dict], int]:
+    """Items of a JSON Lines file from byte ``offset`` on, and the offset after the last complete line"""
+    with open(path, "rb") as fp:
+        fp.seek(offset)
+        data = fp.read()
+    # A trailing partial line is still being written; it is read on a later scan
+    end = data.rfind(b"\n") + 1
+    items = []
+    for line in data[:end].splitlines():
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if _is_news_item(entry):
+            items.append(entry)
+    return items, offset + end
+
+
+class NewsIndex:
+    """In-memory index of the news (or paper) files under ``root``, newest first.
+
+    Files are either JSON (one item or a list) or append-only JSON Lines
+    shards as written by the ingestion pipeline. ``refresh`` stats the
+    directory at most once every ``rescan_interval`` seconds and only parses
+    files that are new or whose mtime or size changed; of a grown shard only
+    the appended lines are read. So serving a page costs a binary search plus ``limit`` items
+    regardless of how many files have been written. ``version`` is a digest
+    of the names, mtimes and sizes of the indexed files, so it changes
+    whenever the indexed items do and stays the same across restarts as
+    long as the files do. Subscribers are told about every file whose
+    items changed.
+    """
+
+    def __init__(self, root: str, rescan_interval: float = 5.0):
+        self.root = root
+        self.rescan_interval = rescan_interval
+        self.version = self._digest({})
+        self.flight = SingleFlight(os.path.basename(root.rstrip("/")))
+        # name -> ((mtime, size), items, bytes consumed)
+        self._files: Dict[str, Tuple[Tuple[int, int], List[dict], int]] = {}
+        self._keys: List[SortKey] = []
+        self._items: List[dict] = []
+        self._subscribers: List[Callable[[str, List[dict]], None]] = []
+        self._lock = threading.Lock()
+        self._scanned_at = float("-inf")
+
+    def __len__(self):
+        return len(self._keys)
+
+    def subscribe(self, callback: Callable[[str, List[dict]], None]):
+        """Call ``callback(file_name, items)`` for every indexed file now and on every change.
+
+        A deleted file is reported with an empty list of items.
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+            files = dict(self._files)
+        for name, (_, items, _) in files.items():
+            callback(name, items)
+
+    def refresh(self, force: bool = False):
+        if not force and time.monotonic() - self._scanned_at < self.rescan_interval:
+            return
+        self.flight.do("scan", self._scan)
+
+    def _scan(self):
+        seen: Dict[str, Tuple[int, int]] = {}
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.name.endswith((".json", ".jsonl")) and entry.is_file():
+                    stat = entry.stat()
+                    seen[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        self._scanned_at = time.monotonic()
+
+        changed = {name: sig for name, sig in seen.items()
+                   if name not in self._files or self._files[name][0] != sig}
+        removed = [name for name in self._files if name not in seen]
+        if not changed and not removed:
+            return
+
+        # name -> (all items of the file, index of the first new item, bytes consumed)
+        parsed: Dict[str, Tuple[List[dict], int, int]] = {}
+        for name, sig in changed.items():
+            path = os.path.join(self.root, name)
+            previous = self._files.get(name)
+            try:
+                if not name.endswith(".jsonl"):
+                    items = _read_items(path)
+                    parsed[name] = (items, 0, sig[1])
+                elif previous is not None and sig[1] >= previous[2]:
+                    new_items, offset = _read_lines(path, previous[2])
+                    parsed[name] = (previous[1] + new_items, len(previous[1]), offset)
+                else:
+                    items, offset = _read_lines(path, 0)
+                    parsed[name] = (items, 0, offset)
+            except Exception as e:
+                # Possibly still being written; retried on the next scan since it is not recorded
+                logger.warning(f"Skipping unreadable news file {name}: {e}")
+        if not parsed and not removed:
+            return
+
+        with self._lock:
+            files = dict(self._files)
+            for name in removed:
+                del files[name]
+            # New files and appended shards only add items; anything else changes existing ones
+            only_added = not removed and all(name not in files or start == len(files[name][1])
+                                             for name, (_, start, _) in parsed.items())
+            for name, (items, _, offset) in parsed.items():
+                files[name] = (changed[name], items, offset)
+            if only_added:
+                # Common case (new files or lines were written): insert without re-sorting everything
+                keys, items = list(self._keys), list(self._items)
+                for name in sorted(parsed):
+                    file_items, start, _ = parsed[name]
+                    for position in range(start, len(file_items)):
+                        item = file_items[position]
+                        key = (item["date"], name, position)
+                        index = bisect.bisect_left(keys, key)
+                        keys.insert(index, key)
+                        items.insert(index, item)
+            else:
+                pairs = sorted(((item["date"], name, position), item)
+                               for name, (_, file_items, _) in files.items()
+                               for position, item in enumerate(file_items))
+                keys = [key for key, _ in pairs]
+                items = [item for _, item in pairs]
+            self._files, self._keys, self._items = files, keys, items
+            self.version = self._digest(files)
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            for name in removed:
+                callback(name, [])
+            for name, (file_items, _, _) in parsed.items():
+                callback(name, file_items)
+        logger.info(f"News index updated: {len(parsed)} files parsed, {len(removed)} removed, "
+                    f"{len(keys)} items")
+
+    @staticmethod
+    def _digest(files: Dict[str, Tuple[Tuple[int, int], List[dict], int]]) -> str:
+        signatures = sorted((name, sig) for name, (sig, _, _) in files.items())
+        return hashlib.sha1(json.dumps(signatures).encode("utf-8")).hexdigest()
+
+    def page(self, limit: int = 50, cursor: Optional[str] = None,
+             since: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        """Items newest first, strictly older than ``cursor`` and dated ``since`` or later.
+
+        Returns the page and the cursor for the next one (None on the last page).
+        """
+        with self._lock:
+            keys, items = self._keys, self._items
+        end = bisect.bisect_left(keys, decode_cursor(cursor)) if cursor else len(keys)
+        lo = bisect.bisect_left(keys, (since,)) if since else 0
+        start = max(lo, end - limit)
+        page = items[start:end][::-1]
+        next_cursor = encode_cursor(keys[start]) if start > lo and page else None
+        return page, next_cursor
@@ -0,0 +1,323 @@
+"""Streaming news ingestion: fetch feeds, parse, normalize, dedup, write date shards.
+
+Each stage is an async generator consuming the previous one, so items flow
+through one at a time and memory stays bounded by the fetch concurrency and
+the writer's batch size, however many items a run sees. Runs in the task
+worker processes, so it only depends on the standard library and requests.
+"""
+import os
+import re
+import json
+import time
+import html
+import asyncio
+import hashlib
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from urllib.request import url2pathname
+from xml.etree import ElementTree
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_SPACE_RE = re.compile(r"\s+")
+_TOKEN_RE = re.compile(r"\w+")
+_TRACKING_PARAMS = re.compile(r"^(utm_\w+|fbclid|gclid|ref|mc_cid|mc_eid)$")
+_ATOM = "{http://www.w3.org/2005/Atom}"
+
+SUMMARY_MAX_CHARS = 1000
+
+
+class FeedSource:
+    """A named feed; ``url`` may be http(s):// or, for local fixtures, file://"""
+
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.url = url
+
+    def __repr__(self):
+        return f"FeedSource({self.name!r}, {self.url!r})"
+
+
+def parse_sources(spec: str) -> List[FeedSource]:
+    """Sources from ``name=url`` pairs (or bare URLs) separated by commas or newlines"""
+    sources = []
+    for entry in re.split(r"[,\n]", spec or ""):
+        entry = entry.split("#")[0].strip()
+        if not entry:
+            continue
+        name, _, url = entry.partition("=") if "=" in entry.split("://")[0] else ("", "", entry)
+        sources.append(FeedSource(name.strip() or urlsplit(url).netloc or url, url.strip()))
+    return sources
+
+
+# --- Fetchers, by URL scheme. Each returns the feed body, or None when unchanged since last time ---
+
+def _fetch_http(url: str, validators: dict) -> Tuple[Optional[bytes], dict]:
+    headers = {"User-Agent": "like-her-news-ingest/1.0"}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    response = requests.get(url, headers=headers, timeout=30)
+    if response.status_code == 304:
+        return None, validators
+    response.raise_for_status()
+    return response.content, {"etag": response.headers.get("ETag"),
+                              "last_modified": response.headers.get("Last-Modified")}
+
+
+def _fetch_file(url: str, validators: dict) -> Tuple[Optional[bytes], dict]:
+    path = url2pathname(urlsplit(url).path)
+    mtime = os.stat(path).st_mtime_ns
+    if validators.get("mtime") == mtime:
+        return None, validators
+    with open(path, "rb") as fp:
+        return fp.read(), {"mtime": mtime}
+
+
+FETCHERS: Dict[str, Callable[[str, dict], Tuple[Optional[bytes], dict]]] = {
+    "http": _fetch_http,
+    "https": _fetch_http,
+    "file": _fetch_file,
+}
+
+
+# --- Seen state ---
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of the word shingles of ``text``"""
+    tokens = _TOKEN_RE.findall(text.lower())
+    shingles = [" ".join(tokens[i:i + 3]) for i in range(max(len(tokens) - 2, 1))]
+    weights = [0] * 64
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+class SeenState:
+    """URLs and SimHashes of items already ingested, plus HTTP validators per feed.
+
+    SimHashes are indexed by four 16-bit bands: two hashes within
+    ``max_distance`` <= 3 bits of each other always share a band, so a
+    near-duplicate check only compares against one band's bucket. Entries
+    older than ``retention_days`` are dropped when the state is saved.
+    """
+
+    def __init__(self, path: str, retention_days: float = 30, max_distance: int = 3):
+        self.path = path
+        self.retention_days = retention_days
+        self.max_distance = max_distance
+        self.urls: Dict[str, float] = {}
+        self.hashes: Dict[int, float] = {}
+        self.feeds: Dict[str, dict] = {}
+        self._bands: List[Dict[int, List[int]]] = [defaultdict(list) for _ in range(4)]
+        try:
+            with open(path) as fp:
+                data = json.load(fp)
+        except FileNotFoundError:
+            data = {}
+        self.urls = data.get("urls", {})
+        self.feeds = data.get("feeds", {})
+        for value, seen_at in data.get("hashes", []):
+            self._add_hash(value, seen_at)
+
+    def _add_hash(self, value: int, seen_at: float):
+        self.hashes[value] = seen_at
+        for band in range(4):
+            self._bands[band][value >> (16 * band) & 0xFFFF].append(value)
+
+    def is_near_duplicate(self, value: int) -> bool:
+        for band in range(4):
+            for other in self._bands[band].get(value >> (16 * band) & 0xFFFF, ()):
+                if bin(value ^ other).count("1") <= self.max_distance:
+                    return True
+        return False
+
+    def add(self, url_key: str, value: int):
+        now = time.time()
+        self.urls[url_key] = now
+        self._add_hash(value, now)
+
+    def save(self):
+        cutoff = time.time() - self.retention_days * 86400
+        data = {
+            "urls": {key: at for key, at in self.urls.items() if at >= cutoff},
+            "hashes": [[value, at] for value, at in self.hashes.items() if at >= cutoff],
+            "feeds": self.feeds,
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as fp:
+            json.dump(data, fp)
+        os.replace(tmp_path, self.path)
+
+
+# --- Stages ---
+
+async def fetch(sources: Iterable[FeedSource], state: SeenState, concurrency: int = 8,
+                stats: Optional[dict] = None) -> AsyncIterator[Tuple[FeedSource, bytes]]:
+    """Fetch feeds concurrently, yielding ``(source, body)`` as each completes"""
+    stats = stats if stats is not None else {}
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    done = object()
+
+    async def fetch_one(source: FeedSource):
+        async with semaphore:
+            fetcher = FETCHERS.get(urlsplit(source.url).scheme)
+            try:
+                if fetcher is None:
+                    raise ValueError(f"Unsupported feed URL: {source.url}")
+                validators = state.feeds.get(source.url, {})
+                body, validators = await asyncio.to_thread(fetcher, source.url, validators)
+                state.feeds[source.url] = validators
+                if body is None:
+                    logger.info(f"Feed {source.name} unchanged since the last run")
+                    stats["unchanged_feeds"] = stats.get("unchanged_feeds", 0) + 1
+                else:
+                    await queue.put((source, body))
+            except Exception as e:
+                logger.error(f"Fetching feed {source.name} ({source.url}) failed: {e}")
+                stats["failed_feeds"] = stats.get("failed_feeds", 0) + 1
+
+    async def run_all():
+        await asyncio.gather(*(fetch_one(source) for source in sources))
+        await queue.put(done)
+
+    runner = asyncio.create_task(run_all())
+    try:
+        while (item := await queue.get()) is not done:
+            yield item
+    finally:
+        runner.cancel()
+
+
+def _text(element, *paths) -> str:
+    for path in paths:
+        found = element.find(path)
+        if found is not None and (found.text or "").strip():
+            return found.text.strip()
+    return ""
+
+
+async def parse(feeds: AsyncIterator[Tuple[FeedSource, bytes]]) -> AsyncIterator[dict]:
+    """Yield the raw entries of RSS 2.0 and Atom feeds"""
+    async for source, body in feeds:
+        try:
+            root = ElementTree.fromstring(body)
+        except ElementTree.ParseError as e:
+            logger.error(f"Feed {source.name} is not valid XML: {e}")
+            continue
+        for item in root.iter("item"):
+            yield {"source": source.name, "title": _text(item, "title"), "url": _text(item, "link", "guid"),
+                   "summary": _text(item, "description", "{http://purl.org/rss/1.0/modules/content/}encoded"),
+                   "date": _text(item, "pubDate", "{http://purl.org/dc/elements/1.1/}date")}
+        for entry in root.iter(f"{_ATOM}entry"):
+            link = entry.find(f"{_ATOM}link[@rel='alternate']")
+            if link is None:
+                link = entry.find(f"{_ATOM}link")
+            yield {"source": source.name, "title": _text(entry, f"{_ATOM}title"),
+                   "url": link.get("href", "") if link is not None else "",
+                   "summary": _text(entry, f"{_ATOM}summary", f"{_ATOM}content"),
+                   "date": _text(entry, f"{_ATOM}published", f"{_ATOM}updated")}
+        await asyncio.sleep(0)
+
+
+def normalize_url(url: str) -> str:
+    """Lowercase scheme and host, drop the fragment, tracking parameters and a trailing slash"""
+    parts = urlsplit(url.strip())
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if not _TRACKING_PARAMS.match(k)])
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/") or "/", query, ""))
+
+
+def _clean(text: str) -> str:
+    return _SPACE_RE.sub(" ", html.unescape(_TAG_RE.sub(" ", text or ""))).strip()
+
+
+def _iso_date(value: str) -> str:
+    parsed = None
+    if value:
+        try:
+            parsed = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            try:
+                parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            except ValueError:
+                parsed = None
+    if parsed is None:
+        parsed = datetime.now(timezone.utc)
+    elif parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+async def normalize(entries: AsyncIterator[dict]) -> AsyncIterator[dict]:
+    """Yield NewsItem-shaped dicts; entries without a title or link are dropped"""
+    async for entry in entries:
+        title = _clean(entry["title"])
+        if not title or not entry["url"]:
+            continue
+        summary = _clean(entry["summary"])
+        if len(summary) > SUMMARY_MAX_CHARS:
+            summary = summary[:SUMMARY_MAX_CHARS].rsplit(" ", 1)[0] + "…"
+        yield {"title": title, "summary": summary, "source": entry["source"],
+               "url": normalize_url(entry["url"]), "date": _iso_date(entry["date"])}
+
+
+async def dedup(items: AsyncIterator[dict], state: SeenState, stats: dict) -> AsyncIterator[dict]:
+    """Drop items whose URL was seen before, or whose title and summary nearly match one that was"""
+    async for item in items:
+        url_key = hashlib.sha1(item["url"].encode("utf-8")).hexdigest()[:16]
+        if url_key in state.urls:
+            stats["seen_urls"] = stats.get("seen_urls", 0) + 1
+            continue
+        fingerprint = simhash(f"{item['title']} {item['summary']}")
+        if state.is_near_duplicate(fingerprint):
+            stats["near_duplicates"] = stats.get("near_duplicates", 0) + 1
+            state.urls[url_key] = time.time()
+            continue
+        state.add(url_key, fingerprint)
+        yield item
+
+
+async def write_shards(items: AsyncIterator[dict], root: str, batch_size: int = 500) -> int:
+    """Append items to ``root/news_<YYYY-MM-DD>.jsonl`` by item date, a batch at a time"""
+    written = 0
+    batch: Dict[str, List[str]] = defaultdict(list)
+    pending = 0
+
+    def flush():
+        for day, lines in batch.items():
+            with open(os.path.join(root, f"news_{day}.jsonl"), "a", encoding="utf-8") as fp:
+                fp.write("".join(lines))
+        batch.clear()
+
+    async for item in items:
+        batch[item["date"][:10]].append(json.dumps(item, ensure_ascii=False) + "\n")
+        pending += 1
+        written += 1
+        if pending >= batch_size:
+            flush()
+            pending = 0
+    flush()
+    return written
+
+
+async def ingest(sources: List[FeedSource], root: str, state_path: str, concurrency: int = 8) -> dict:
+    """Run the whole pipeline once; returns counters for the run"""
+    os.makedirs(root, exist_ok=True)
+    state = SeenState(state_path)
+    stats = {"feeds": len(sources)}
+    items = dedup(normalize(parse(fetch(sources, state, concurrency, stats))), state, stats)
+    stats["written"] = await write_shards(items, root)
+    state.save()
+    logger.info(f"News ingestion finished: {stats}")
+    return stats
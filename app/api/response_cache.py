@@ -0,0 +1,77 @@
+import re
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+_SPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCT_RE = re.compile(r"[\s.!?。！？、,]+$")
+
+
+def normalize_message(text: str) -> str:
+    """Fold case, width, whitespace and trailing punctuation, so trivial variants match"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = _SPACE_RE.sub(" ", text).strip()
+    return _TRAILING_PUNCT_RE.sub("", text)
+
+
+class ResponseCache:
+    """LRU + TTL cache of model answers keyed on prompt, context and model.
+
+    Keys hash the normalized message together with the exact history sent
+    to the model (rolling summary included) and the agent/model identity,
+    so the same question in the same context is answered once per ``ttl``
+    seconds, and an answer never leaks into a conversation whose earlier
+    context differs.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def key(self, message: str, history: List[dict], *model_ids: str) -> str:
+        parts = list(model_ids)
+        parts += [f"{m.get('role')}:{normalize_message(m.get('content'))}" for m in history]
+        parts.append(normalize_message(message))
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+                self._evictions += 1
+            self._misses += 1
+            return None
+
+    def put(self, key: str, response: str):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+            }
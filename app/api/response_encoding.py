@@ -0,0 +1,135 @@
+import gzip
+import json
+from typing import Dict, Optional
+
+import msgpack
+import numpy as np
+import pyarrow as pa
+import zstandard
+from fastapi import Request
+from fastapi.responses import Response
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_SIZE = 1024
+
+_zstd_compressor = zstandard.ZstdCompressor(level=3)
+
+
+def _accepted(header: Optional[str]) -> Dict[str, float]:
+    """Parse an Accept / Accept-Encoding header into {value: quality}"""
+    accepted = {}
+    for part in (header or "").split(","):
+        value, _, params = part.strip().partition(";")
+        if not value:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, q = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(q)
+                except ValueError:
+                    quality = 0.0
+        accepted[value.strip().lower()] = quality
+    return accepted
+
+
+def negotiate_media_type(request: Request) -> str:
+    """Pick the response format; JSON unless the client prefers a binary one"""
+    accepted = _accepted(request.headers.get("accept"))
+    best, best_quality = JSON_MEDIA_TYPE, accepted.get(JSON_MEDIA_TYPE, 0.0)
+    for media_type in (ARROW_MEDIA_TYPE, MSGPACK_MEDIA_TYPE):
+        quality = accepted.get(media_type, 0.0)
+        if quality > best_quality:
+            best, best_quality = media_type, quality
+    return best
+
+
+def negotiate_encoding(request: Request) -> Optional[str]:
+    accepted = _accepted(request.headers.get("accept-encoding"))
+    for encoding in ("zstd", "gzip"):
+        if accepted.get(encoding, 0.0) > 0:
+            return encoding
+    return None
+
+
+def _json_list(values) -> list:
+    if isinstance(values, np.ndarray):
+        if values.dtype.kind == "M":
+            return np.datetime_as_string(values, unit="D").tolist()
+        if values.dtype.kind == "f" and not np.isfinite(values).all():
+            # JSON has no NaN, so missing indicator values become null
+            return [v if np.isfinite(v) else None for v in values.tolist()]
+        return values.tolist()
+    return list(values)
+
+
+def encode_json(columns: dict, meta: dict) -> bytes:
+    payload = {name: _json_list(values) for name, values in columns.items()}
+    payload.update(meta)
+    return json.dumps(payload, separators=(",", ":"), allow_nan=False).encode("utf-8")
+
+
+def encode_msgpack(columns: dict, meta: dict) -> bytes:
+    """Numeric columns become {dtype, data} typed arrays; others stay lists.
+
+    A client rebuilds an array with ``np.frombuffer(col["data"], col["dtype"])``.
+    """
+    payload = {}
+    for name, values in columns.items():
+        if isinstance(values, np.ndarray) and values.dtype.kind in "fiuM":
+            values = np.ascontiguousarray(values)
+            payload[name] = {"dtype": values.dtype.str, "data": values.tobytes()}
+        else:
+            payload[name] = list(values)
+    payload.update(meta)
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def encode_arrow(columns: dict, meta: dict) -> bytes:
+    """One record batch in the Arrow IPC stream format; ``meta`` goes in the schema metadata"""
+    arrays = {}
+    for name, values in columns.items():
+        if isinstance(values, np.ndarray) and values.dtype.kind == "M":
+            arrays[name] = pa.array(values.astype("datetime64[D]"), type=pa.date32())
+        elif isinstance(values, np.ndarray) and values.dtype.kind == "f":
+            arrays[name] = pa.array(values, from_pandas=True)  # NaN -> null
+        else:
+            arrays[name] = pa.array(values)
+    table = pa.table(arrays)
+    table = table.replace_schema_metadata({"meta": json.dumps(meta)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+ENCODERS = {
+    JSON_MEDIA_TYPE: encode_json,
+    MSGPACK_MEDIA_TYPE: encode_msgpack,
+    ARROW_MEDIA_TYPE: encode_arrow,
+}
+
+
+def columnar_response(request: Request, columns: dict, meta: dict, headers: Optional[dict] = None) -> Response:
+    """Encode equal-length ``columns`` plus scalar ``meta`` as the client asked.
+
+    The format follows the Accept header (JSON by default) and large bodies
+    are compressed with zstd or gzip according to Accept-Encoding.
+    """
+    media_type = negotiate_media_type(request)
+    body = ENCODERS[media_type](columns, meta)
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept, Accept-Encoding"
+    encoding = negotiate_encoding(request) if len(body) >= MIN_COMPRESS_SIZE else None
+    if encoding == "zstd":
+        body = _zstd_compressor.compress(body)
+    elif encoding == "gzip":
+        body = gzip.compress(body, compresslevel=5)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -0,0 +1,43 @@
+import json
+import sqlite3
+from typing import List, Optional
+
+
+class RunHistoryReader:
+    """Read-only view of the scheduler's run history database (see the scheduler's RunHistory)"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def query(self, job: Optional[str] = None, status: Optional[str] = None,
+              since: Optional[float] = None, limit: int = 50) -> List[dict]:
+        """Most recent runs first, optionally filtered by job, status and start time"""
+        clauses, params = [], []
+        if job:
+            clauses.append("job = ?")
+            params.append(job)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if since is not None:
+            clauses.append("started_at >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        try:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        except sqlite3.OperationalError:
+            # The scheduler has not recorded any run yet
+            return []
+        try:
+            rows = conn.execute(
+                f"SELECT id, job, status, started_at, duration, detail FROM runs {where} "
+                "ORDER BY started_at DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [
+            {"id": id, "job": job, "status": status, "started_at": started_at,
+             "duration": duration, "detail": json.loads(detail) if detail else None}
+            for id, job, status, started_at, duration, detail in rows
+        ]
@@ -0,0 +1,156 @@
+import re
+import math
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Latin words and digits are terms; runs of CJK characters are split into overlapping bigrams
+_WORD_RE = re.compile(r"[0-9a-z]+|[぀-ヿ㐀-䶿一-鿿가-힯]+")
+_CJK_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]")
+
+# Fields that are indexed, with how many times each occurrence counts
+SEARCH_FIELDS = {"title": 3, "summary": 1, "source": 1}
+
+COLLECTIONS = ("news", "papers")
+
+
+def tokenize(text: str) -> List[str]:
+    terms = []
+    for word in _WORD_RE.findall((text or "").lower()):
+        if _CJK_RE.match(word):
+            terms.extend(word[i:i + 2] for i in range(max(len(word) - 1, 1)))
+        else:
+            terms.append(word)
+    return terms
+
+
+class SearchIndex:
+    """Inverted index over news and paper items, ranked with BM25.
+
+    Documents are added and removed one file at a time through
+    ``replace_file``, which the news indexes call whenever a file is new,
+    changed or deleted, so the index never has to be rebuilt (items of an
+    appended shard that were indexed before are kept as they are). Each
+    document occupies a slot; the postings of a term are packed into arrays
+    of slots and term frequencies the first time a query needs them after a
+    change, so a query is scored with a few vectorized operations per term.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._packed: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._docs: List[Optional[dict]] = []
+        self._doc_terms: List[List[str]] = []
+        self._lengths = np.zeros(0, dtype=np.float64)
+        self._collections = np.zeros(0, dtype=np.int8)
+        self._free: List[int] = []
+        self._files: Dict[Tuple[str, str], List[int]] = {}
+        self._count = 0
+        self._total_length = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def _allocate(self) -> int:
+        if self._free:
+            return self._free.pop()
+        slot = len(self._docs)
+        self._docs.append(None)
+        self._doc_terms.append([])
+        if slot >= len(self._lengths):
+            capacity = max(1024, 2 * len(self._lengths))
+            self._lengths = np.resize(self._lengths, capacity)
+            self._collections = np.resize(self._collections, capacity)
+        return slot
+
+    def replace_file(self, collection: str, name: str, items: List[dict]):
+        """Index ``items`` as the contents of file ``name``, dropping what it held before"""
+        code = COLLECTIONS.index(collection)
+        with self._lock:
+            previous = self._files.pop((collection, name), [])
+            # Items still at the same position (e.g. a shard that was appended to) keep their slots
+            kept = 0
+            while kept < min(len(previous), len(items)) and self._docs[previous[kept]] is items[kept]:
+                kept += 1
+            for slot in previous[kept:]:
+                self._remove(slot)
+            slots = previous[:kept]
+            for item in items[kept:]:
+                slot = self._allocate()
+                terms = Counter()
+                for field, weight in SEARCH_FIELDS.items():
+                    for term in tokenize(item.get(field)):
+                        terms[term] += weight
+                for term, tf in terms.items():
+                    self._postings.setdefault(term, {})[slot] = tf
+                    self._packed.pop(term, None)
+                length = sum(terms.values())
+                self._docs[slot] = item
+                self._doc_terms[slot] = list(terms)
+                self._lengths[slot] = length
+                self._collections[slot] = code
+                self._total_length += length
+                self._count += 1
+                slots.append(slot)
+            if slots:
+                self._files[(collection, name)] = slots
+
+    def _remove(self, slot: int):
+        for term in self._doc_terms[slot]:
+            postings = self._postings[term]
+            del postings[slot]
+            self._packed.pop(term, None)
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._lengths[slot]
+        self._lengths[slot] = 0
+        self._docs[slot] = None
+        self._doc_terms[slot] = []
+        self._count -= 1
+        self._free.append(slot)
+
+    def _pack(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        packed = self._packed.get(term)
+        if packed is None:
+            postings = self._postings.get(term)
+            if not postings:
+                return None
+            packed = self._packed[term] = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float64, count=len(postings)),
+            )
+        return packed
+
+    def search(self, query: str, limit: int = 20, offset: int = 0,
+               collection: Optional[str] = None) -> Tuple[List[Tuple[float, str, dict]], int]:
+        """Ranked ``(score, collection, item)`` hits for ``query`` and the total number of matches"""
+        terms = set(tokenize(query))
+        with self._lock:
+            if not terms or not self._count:
+                return [], 0
+            k1, b = self.k1, self.b
+            avg_length = self._total_length / self._count
+            scores = np.zeros(len(self._docs), dtype=np.float64)
+            for term in terms:
+                packed = self._pack(term)
+                if packed is None:
+                    continue
+                slots, tf = packed
+                idf = math.log(1 + (self._count - len(slots) + 0.5) / (len(slots) + 0.5))
+                norm = k1 * (1 - b + b * self._lengths[slots] / avg_length)
+                scores[slots] += idf * tf * (k1 + 1) / (tf + norm)
+            if collection is not None:
+                scores[self._collections[:len(scores)] != COLLECTIONS.index(collection)] = 0
+            matched = np.flatnonzero(scores)
+            wanted = offset + limit
+            if len(matched) > wanted:
+                matched = matched[np.argpartition(-scores[matched], wanted - 1)[:wanted]]
+            ranked = matched[np.argsort(-scores[matched], kind="stable")][offset:]
+            hits = [(float(scores[slot]), COLLECTIONS[self._collections[slot]], self._docs[slot])
+                    for slot in ranked]
+        return hits, int(np.count_nonzero(scores))
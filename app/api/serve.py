@@ -0,0 +1,36 @@
+"""Entry point of the API server: ``python -u serve.py``.
+
+Task workers are spawned processes, and a spawned process re-imports the
+parent's ``__main__`` script. So the server must not be started as
+``python main.py``, or every worker would rebuild the whole app (AI
+Platform, Firestore, the agent pool, ...). This script only imports
+``main`` when it is run, not when a worker re-imports it.
+"""
+import os
+import sys
+import logging
+
+if __name__ == "__main__":
+    import uvicorn
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger("serve")
+
+    # More detailed logging for startup
+    logger.info("Starting API service")
+    logger.info(f"Python version: {sys.version}")
+    logger.info(f"Current working directory: {os.getcwd()}")
+    logger.info(f"Environment: {os.environ.get('ENVIRONMENT', 'production')}")
+
+    # Get the port from environment variable
+    port = int(os.environ.get("PORT", 8080))
+    logger.info(f"Port configuration: Using port {port} (from environment: {os.environ.get('PORT')})")
+
+    try:
+        logger.info(f"Starting server on port {port}")
+        uvicorn.run("main:app", host="0.0.0.0", port=port)
+    except Exception as e:
+        logger.error(f"Failed to start server: {str(e)}")
+        # Print to stderr as well for Cloud Run logs
+        print(f"ERROR: Failed to start server: {str(e)}", file=sys.stderr)
+        raise
@@ -0,0 +1,106 @@
+import logging
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+from google.cloud import firestore
+
+from firestore_writer import WriteBehindQueue
+from stock_store import PRICE_COLUMNS, StockSeries
+
+logger = logging.getLogger(__name__)
+
+# One document per bar: stock_bars/{symbol}/bars/{YYYY-MM-DD}
+BARS_COLLECTION = "stock_bars"
+
+
+class StockBarRepository:
+    """Normalized Firestore layout for daily bars, one document per (symbol, date).
+
+    Document ids are the bar dates, so writing a bar twice is an idempotent
+    upsert. The range of dates already stored is tracked per symbol, and
+    only bars outside it are written: older ones when the local cache was
+    extended backwards (e.g. a ``max`` request after a ``1mo`` one), and
+    newer ones from the last stored date on. The last stored bar is
+    included because it may have been an unfinished trading day, and the
+    write-behind queue drops it if it did not change.
+    """
+
+    def __init__(self, client, writer: WriteBehindQueue):
+        self.client = client
+        self.writer = writer
+        # symbol -> (oldest, newest) stored date, or None when nothing is stored
+        self._ranges: Dict[str, Optional[Tuple[str, str]]] = {}
+        self._lock = threading.Lock()
+
+    def _bars(self, symbol: str):
+        return self.client.collection(BARS_COLLECTION).document(symbol).collection("bars")
+
+    def _stored_range(self, symbol: str) -> Optional[Tuple[str, str]]:
+        """Dates of the oldest and newest bars already stored for ``symbol``"""
+        with self._lock:
+            if symbol in self._ranges:
+                return self._ranges[symbol]
+        ends = []
+        for direction in (firestore.Query.ASCENDING, firestore.Query.DESCENDING):
+            query = self._bars(symbol).order_by("Date", direction=direction).limit(1)
+            ends += [doc.to_dict().get("Date") for doc in query.stream()]
+        stored = (ends[0], ends[1]) if len(ends) == 2 else None
+        with self._lock:
+            return self._ranges.setdefault(symbol, stored)
+
+    def upsert(self, series: StockSeries) -> int:
+        """Queue the bars of ``series`` that are not stored yet; return how many were queued"""
+        if not len(series):
+            return 0
+        dates = np.datetime_as_string(series.dates, unit="D")
+        stored = self._stored_range(series.symbol)
+        if stored is None:
+            positions = range(len(dates))
+        else:
+            oldest = int(np.searchsorted(dates, stored[0], side="left"))
+            newest = int(np.searchsorted(dates, stored[1], side="left"))
+            positions = [*range(oldest), *range(newest, len(dates))]
+        bars = self._bars(series.symbol)
+        queued = 0
+        for i in positions:
+            date = str(dates[i])
+            bar = {"Date": date, "Symbol": series.symbol}
+            bar.update({col: series.columns[col][i].item() for col in PRICE_COLUMNS})
+            if self.writer.submit(f"{series.symbol}/{date}", bars.document(date), bar):
+                queued += 1
+        with self._lock:
+            first, last = str(dates[0]), str(dates[-1])
+            if stored is not None:
+                first, last = min(first, stored[0]), max(last, stored[1])
+            self._ranges[series.symbol] = (first, last)
+        if queued:
+            logger.info(f"Queued {queued} new bars for {series.symbol} for Firestore")
+        return queued
+
+    def read(self, symbol: str, start: Optional[str] = None, end: Optional[str] = None,
+             fields: Optional[Iterable[str]] = None) -> dict:
+        """Return bars of ``symbol`` between ``start`` and ``end`` (inclusive) as columns.
+
+        ``fields`` limits the price columns fetched from Firestore; the Date
+        column is always included.
+        """
+        fields = list(fields) if fields else list(PRICE_COLUMNS)
+        unknown = [field for field in fields if field not in PRICE_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        query = self._bars(symbol)
+        if start:
+            query = query.where("Date", ">=", start)
+        if end:
+            query = query.where("Date", "<=", end)
+        query = query.order_by("Date").select(["Date"] + fields)
+
+        data = {"Date": [], **{field: [] for field in fields}}
+        for doc in query.stream():
+            bar = doc.to_dict()
+            data["Date"].append(bar.get("Date"))
+            for field in fields:
+                data[field].append(bar.get(field))
+        data["Symbol"] = symbol
+        return data
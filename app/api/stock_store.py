@@ -0,0 +1,196 @@
+import os
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import numpy as np
+import yfinance as yf
+
+from singleflight import SingleFlight
+from stock_files import (FULL_HISTORY, PRICE_COLUMNS, bar_file_lock, bar_file_path, covered_from,
+                         from_history, merge_bars, period_start, read_bar_file, write_bar_file)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StockSeries:
+    """Daily OHLCV bars for one symbol, stored column by column"""
+    symbol: str
+    dates: np.ndarray            # datetime64[D], ascending
+    columns: Dict[str, np.ndarray]
+    covered_from: np.datetime64  # bars are complete from this date onwards
+    fetched_at: float            # unix time of the last upstream fetch
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def last_date(self) -> Optional[np.datetime64]:
+        return self.dates[-1] if len(self.dates) else None
+
+    @property
+    def version(self) -> tuple:
+        """Changes whenever the bars change: first and last date, length and last bar"""
+        if not len(self.dates):
+            return (self.symbol, 0)
+        last_bar = tuple(self.columns[col][-1].item() for col in PRICE_COLUMNS)
+        return (self.symbol, len(self.dates), str(self.dates[0]), str(self.dates[-1])) + last_bar
+
+    def window(self, period: str) -> "StockSeries":
+        """Return the bars that a yfinance ``period`` request would cover"""
+        start = window_start(self, period)
+        return StockSeries(
+            symbol=self.symbol,
+            dates=self.dates[start:],
+            columns={col: values[start:] for col, values in self.columns.items()},
+            covered_from=self.covered_from,
+            fetched_at=self.fetched_at,
+        )
+
+
+def window_start(series: StockSeries, period: str) -> int:
+    """Index of the first bar belonging to ``period``"""
+    if period == "max":
+        return 0
+    if period.endswith("d") and period != "ytd":
+        return max(len(series) - int(period[:-1]), 0)
+    return int(np.searchsorted(series.dates, period_start(period), side="left"))
+
+
+def validate_period(period: str):
+    if period == "max" or period == "ytd":
+        return
+    for suffix in ("d", "mo", "y"):
+        if period.endswith(suffix) and period[:-len(suffix)].isdigit():
+            return
+    raise ValueError(f"Unsupported period: {period}")
+
+
+class StockStore:
+    """Incremental on-disk cache of daily OHLCV bars, one file per symbol.
+
+    A request only goes upstream for bars newer than the last cached one
+    (the last bar is always refetched, since it may still be in progress),
+    or when it asks for a longer history than has been cached so far.
+    Within ``ttl`` seconds of the last fetch no upstream call is made at all.
+    Concurrent requests needing the same upstream call share a single one.
+    The files are also written by the scheduler's ingester (see
+    ``stock_files``), so a file that changed on disk is always re-read.
+    """
+
+    def __init__(self, root: str, ttl: float = 300):
+        self.root = root
+        self.ttl = ttl
+        os.makedirs(root, exist_ok=True)
+        self._series: Dict[str, StockSeries] = {}
+        self._mtimes: Dict[str, float] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self.flight = SingleFlight("stocks")
+
+    def _path(self, symbol: str) -> str:
+        return bar_file_path(self.root, symbol)
+
+    def _lock(self, symbol: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(symbol, threading.Lock())
+
+    def load(self, symbol: str) -> Optional[StockSeries]:
+        """Return the cached series, re-reading the file if it changed on disk"""
+        path = self._path(symbol)
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return None
+        cached = self._series.get(symbol)
+        if cached is not None and self._mtimes.get(symbol) == mtime:
+            return cached
+        stored = read_bar_file(path)
+        if stored is None:
+            return None
+        series = StockSeries(symbol, *stored)
+        self._series[symbol] = series
+        self._mtimes[symbol] = mtime
+        return series
+
+    def save(self, series: StockSeries):
+        path = self._path(series.symbol)
+        write_bar_file(path, series.dates, series.columns, series.covered_from, series.fetched_at)
+        self._series[series.symbol] = series
+        self._mtimes[series.symbol] = os.stat(path).st_mtime
+
+    def peek(self, symbol: str, period: str) -> Optional[StockSeries]:
+        """Return the in-memory series if it can serve ``period`` without reading or fetching bars.
+
+        Costs one stat: a file rewritten since it was loaded (e.g. by the
+        scheduler's ingester) is not served from memory.
+        """
+        validate_period(period)
+        series = self._series.get(symbol)
+        if series is None or time.time() - series.fetched_at > self.ttl:
+            return None
+        try:
+            if os.stat(self._path(symbol)).st_mtime != self._mtimes.get(symbol):
+                return None
+        except FileNotFoundError:
+            return None
+        return series if self._covers(series, period) else None
+
+    def get(self, symbol: str, period: str = "1mo") -> StockSeries:
+        """Return the cached series for ``symbol``, covering at least ``period``"""
+        validate_period(period)
+        series = self.load(symbol)
+        if series is None or not self._covers(series, period):
+            return self.flight.do((symbol, period), self._fetch_period, symbol, period)
+        if time.time() - series.fetched_at > self.ttl:
+            return self.flight.do((symbol, "tail"), self._fetch_tail, series)
+        return series
+
+    def _covers(self, series: StockSeries, period: str) -> bool:
+        if period == "max":
+            return series.covered_from == FULL_HISTORY
+        if period.endswith("d") and period != "ytd":
+            return len(series) >= int(period[:-1]) or series.covered_from == FULL_HISTORY
+        return series.covered_from <= period_start(period)
+
+    def _fetch_period(self, symbol: str, period: str) -> StockSeries:
+        logger.info(f"Fetching {period} of history for {symbol} from upstream")
+        hist = yf.Ticker(symbol).history(period=period)
+        with self._lock(symbol), bar_file_lock(self._path(symbol)):
+            # Re-read under the lock: a concurrent fetch (or the ingester) may have saved meanwhile
+            cached = self.load(symbol)
+            if hist.empty:
+                if cached is not None:
+                    return cached
+                raise ValueError(f"No data returned for symbol {symbol}")
+            dates, columns = from_history(hist)
+            covered = covered_from(period, dates)
+            if cached is not None and len(cached) and cached.covered_from < covered \
+                    and cached.last_date >= dates[0]:
+                # Keep the longer history already cached and overlay the fresh bars
+                dates, columns = merge_bars(cached.dates, cached.columns, dates, columns)
+                covered = cached.covered_from
+            series = StockSeries(symbol, dates, columns, covered, time.time())
+            self.save(series)
+            return series
+
+    def _fetch_tail(self, series: StockSeries) -> StockSeries:
+        start = str(series.last_date)
+        logger.info(f"Fetching bars for {series.symbol} since {start} from upstream")
+        try:
+            hist = yf.Ticker(series.symbol).history(start=start)
+        except Exception as e:
+            logger.error(f"Incremental fetch failed for {series.symbol}, serving cached bars: {e}")
+            return series
+        with self._lock(series.symbol), bar_file_lock(self._path(series.symbol)):
+            series = self.load(series.symbol) or series
+            dates, columns = series.dates, series.columns
+            if not hist.empty:
+                new_dates, new_columns = from_history(hist)
+                dates, columns = merge_bars(dates, columns, new_dates, new_columns)
+            series = StockSeries(series.symbol, dates, columns, series.covered_from, time.time())
+            self.save(series)
+            return series
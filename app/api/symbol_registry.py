@@ -0,0 +1,123 @@
+import os
+import json
+import time
+import logging
+import threading
+from concurrent.futures import Executor
+from typing import Dict, Iterable, Optional
+
+import yfinance as yf
+
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+def fetch_symbol_info(symbol: str) -> dict:
+    """Look up the metadata of ``symbol`` upstream (the slow ``Ticker.info`` call)"""
+    info = yf.Ticker(symbol).info
+    return {
+        "symbol": symbol,
+        "name": info.get("shortName") or info.get("longName") or symbol,
+        "exchange": info.get("exchange"),
+        "currency": info.get("currency"),
+        "timezone": info.get("exchangeTimezoneName"),
+        "updated_at": time.time(),
+    }
+
+
+class SymbolRegistry:
+    """Symbol metadata (name, exchange, currency, timezone) persisted as one JSON file.
+
+    Entries are refreshed after ``ttl`` seconds. A stale entry is still
+    served while the refresh runs in the background, so only the very first
+    lookup of a symbol waits for the upstream call, and concurrent lookups
+    of the same unknown symbol share that call.
+    """
+
+    def __init__(self, path: str, ttl: float = 7 * 24 * 3600, executor: Optional[Executor] = None):
+        self.path = path
+        self.ttl = ttl
+        self.executor = executor
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self.flight = SingleFlight("symbols")
+        self._entries: Dict[str, dict] = self._load()
+
+    def _load(self) -> Dict[str, dict]:
+        try:
+            with open(self.path) as fp:
+                return json.load(fp)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.error(f"Could not read symbol registry {self.path}, starting empty: {e}")
+            return {}
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as fp:
+            json.dump(self._entries, fp)
+        os.replace(tmp_path, self.path)
+
+    def _is_fresh(self, entry: dict) -> bool:
+        return time.time() - entry.get("updated_at", 0) < self.ttl
+
+    def all(self) -> Dict[str, dict]:
+        with self._lock:
+            return dict(self._entries)
+
+    def peek(self, symbol: str) -> Optional[dict]:
+        """Return the known entry for ``symbol`` without any upstream call"""
+        with self._lock:
+            return self._entries.get(symbol)
+
+    def get(self, symbol: str) -> dict:
+        """Return the metadata of ``symbol``, fetching it upstream only when unknown"""
+        with self._lock:
+            entry = self._entries.get(symbol)
+        if entry is None:
+            return self.refresh(symbol)
+        if not self._is_fresh(entry):
+            self._refresh_in_background(symbol)
+        return entry
+
+    def refresh(self, symbol: str) -> dict:
+        return self.flight.do(symbol, self._refresh, symbol)
+
+    def _refresh(self, symbol: str) -> dict:
+        entry = fetch_symbol_info(symbol)
+        with self._lock:
+            self._entries[symbol] = entry
+            self._save()
+        logger.info(f"Updated symbol metadata for {symbol}")
+        return entry
+
+    def _refresh_in_background(self, symbol: str):
+        with self._lock:
+            if self.executor is None or symbol in self._refreshing:
+                return
+            self._refreshing.add(symbol)
+
+        def run():
+            try:
+                self.refresh(symbol)
+            except Exception as e:
+                logger.error(f"Background refresh of symbol metadata for {symbol} failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(symbol)
+
+        self.executor.submit(run)
+
+    def warm(self, symbols: Iterable[str]):
+        """Make sure every symbol in ``symbols`` has a fresh entry"""
+        for symbol in symbols:
+            with self._lock:
+                entry = self._entries.get(symbol)
+            if entry is not None and self._is_fresh(entry):
+                continue
+            try:
+                self.refresh(symbol)
+            except Exception as e:
+                logger.error(f"Could not warm symbol metadata for {symbol}: {e}")
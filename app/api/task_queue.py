@@ -0,0 +1,137 @@
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from concurrent.futures import Executor
+from typing import Optional, Tuple
+
+import task_workers
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    args TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_active ON tasks (kind, args) WHERE status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS tasks_finished ON tasks (finished_at);
+"""
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class TaskQueue:
+    """Persistent queue of background tasks, run on a separate executor.
+
+    Tasks are rows in a SQLite table, so their IDs and outcomes survive
+    restarts; tasks still queued or running when the process stopped are
+    run again by ``recover``. Submitting a task identical (same kind and
+    arguments) to one that is queued or running returns that task instead
+    of starting another. Task functions come from ``task_workers`` and run
+    on ``executor``, normally a process pool, so they never compete with
+    request handling for the serving process's CPU.
+    """
+
+    def __init__(self, path: str, executor: Executor, retention_days: float = 7):
+        self.path = path
+        self.executor = executor
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def submit(self, kind: str, args: Optional[dict] = None) -> Tuple[dict, bool]:
+        """Queue a ``kind`` task; returns the task and whether it was newly created"""
+        if kind not in task_workers.TASKS:
+            raise ValueError(f"Unknown task: {kind}")
+        args_json = json.dumps(args or {}, sort_keys=True)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM tasks WHERE kind = ? AND args = ? AND status IN (?, ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (kind, args_json, *ACTIVE_STATUSES),
+                ).fetchone()
+                if row is None:
+                    task_id = uuid.uuid4().hex
+                    self._conn.execute(
+                        "INSERT INTO tasks (id, kind, args, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                        (task_id, kind, args_json, time.time()),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is not None:
+            logger.info(f"Task {kind} {args_json} already {row['status']} as {row['id']}")
+            return self._to_dict(row), False
+        self._dispatch(task_id, kind, args or {})
+        return self.get(task_id), True
+
+    def get(self, task_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def recover(self):
+        """Re-run tasks left queued or running by a previous process and drop old finished ones"""
+        with self._lock:
+            self._conn.execute("DELETE FROM tasks WHERE finished_at < ?",
+                               (time.time() - self.retention_days * 86400,))
+            rows = self._conn.execute(
+                "SELECT id, kind, args FROM tasks WHERE status IN (?, ?) ORDER BY created_at",
+                ACTIVE_STATUSES,
+            ).fetchall()
+            self._conn.execute("UPDATE tasks SET status = 'queued', started_at = NULL WHERE status = 'running'")
+        for row in rows:
+            logger.info(f"Resuming task {row['kind']} {row['id']}")
+            self._dispatch(row["id"], row["kind"], json.loads(row["args"]))
+
+    def _update(self, task_id: str, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE tasks SET {assignments} WHERE id = ?", (*fields.values(), task_id))
+
+    def _dispatch(self, task_id: str, kind: str, args: dict):
+        # The worker marks the task running when it actually starts it
+        try:
+            future = self.executor.submit(task_workers.run_task, self.path, task_id, kind, args)
+        except Exception as e:
+            self._update(task_id, status="failed", finished_at=time.time(), error=f"Could not start: {e}")
+            raise
+
+        def done(future):
+            if future.cancelled():
+                # Shutting down: left queued, so the next process picks it up again
+                return
+            try:
+                result = future.result()
+            except BaseException as e:
+                logger.error(f"Task {kind} {task_id} failed: {e}")
+                self._update(task_id, status="failed", finished_at=time.time(), error=str(e) or repr(e))
+            else:
+                logger.info(f"Task {kind} {task_id} succeeded")
+                self._update(task_id, status="succeeded", finished_at=time.time(),
+                             result=json.dumps(result, default=str))
+
+        future.add_done_callback(done)
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> dict:
+        task = dict(row)
+        task["args"] = json.loads(task["args"])
+        task["result"] = json.loads(task["result"]) if task["result"] else None
+        return task
@@ -0,0 +1,66 @@
+"""Task functions run by the task queue's worker processes.
+
+Workers are spawned fresh and only import this module (plus ``serve.py``,
+the ``__main__`` script, which imports nothing when re-imported), so it
+must stay light: no import of ``main`` (which would rebuild the whole app,
+agent pool and all, in every worker) and nothing that needs the serving
+process.
+"""
+import os
+import time
+import sqlite3
+import logging
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.environ.get("DATA_DIR", "/data")
+
+
+def init_worker():
+    logging.basicConfig(level=logging.INFO)
+
+
+def fetch_news() -> dict:
+    """Task to fetch the configured news feeds into date-sharded files under DATA_DIR/news"""
+    # Imported here so fetch-papers workers don't pay for it
+    import asyncio
+    from news_pipeline import ingest, parse_sources
+
+    logger.info("Fetching AI news in background")
+    sources = parse_sources(os.environ.get("NEWS_FEEDS", ""))
+    if os.environ.get("NEWS_FEEDS_FILE"):
+        with open(os.environ["NEWS_FEEDS_FILE"]) as fp:
+            sources += parse_sources(fp.read())
+    if not sources:
+        logger.warning("No news feeds configured (NEWS_FEEDS / NEWS_FEEDS_FILE)")
+        return {"feeds": 0, "written": 0}
+    stats = asyncio.run(ingest(sources, f"{DATA_DIR}/news", f"{DATA_DIR}/news_seen.json",
+                               concurrency=int(os.environ.get("NEWS_FETCH_CONCURRENCY", 8))))
+    logger.info("News fetch completed")
+    return stats
+
+
+def fetch_papers() -> dict:
+    """Task to fetch and store latest research papers"""
+    logger.info("Fetching research papers in background")
+    # In production, this would use an academic paper API
+    # For now, just log that it ran
+    logger.info("Research papers fetch completed")
+    return {}
+
+
+TASKS = {
+    "fetch-news": fetch_news,
+    "fetch-papers": fetch_papers,
+}
+
+
+def run_task(db_path: str, task_id: str, kind: str, args: dict):
+    """Mark the task running in the queue's database, then run it; the serving process records the outcome"""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        with conn:
+            conn.execute("UPDATE tasks SET status = 'running', started_at = ? WHERE id = ?", (time.time(), task_id))
+    finally:
+        conn.close()
+    return TASKS[kind](**args)
@@ -0,0 +1,82 @@
+"""Runs the news pipeline against the local fixture feeds in fixtures/news: pytest test_news_pipeline.py"""
+import os
+import json
+import shutil
+import asyncio
+from pathlib import Path
+
+from news_pipeline import FeedSource, ingest
+
+FIXTURES = Path(__file__).parent / "fixtures" / "news"
+
+
+def run(tmp_path, feeds):
+    sources = [FeedSource(path.stem, path.as_uri()) for path in feeds]
+    return asyncio.run(ingest(sources, str(tmp_path / "news"), str(tmp_path / "seen.json")))
+
+
+def written_items(tmp_path):
+    items = []
+    for shard in sorted((tmp_path / "news").glob("news_*.jsonl")):
+        items += [json.loads(line) for line in shard.read_text(encoding="utf-8").splitlines()]
+    return items
+
+
+def copy_feeds(tmp_path):
+    feeds = []
+    for name in ("rss.xml", "atom.xml"):
+        shutil.copy(FIXTURES / name, tmp_path / name)
+        feeds.append(tmp_path / name)
+    return feeds
+
+
+def test_parses_normalizes_and_shards_by_date(tmp_path):
+    run(tmp_path, copy_feeds(tmp_path))
+    items = written_items(tmp_path)
+    by_title = {item["title"]: item for item in items}
+    assert sorted(path.name for path in (tmp_path / "news").iterdir()) == [
+        "news_2026-10-14.jsonl", "news_2026-10-15.jsonl", "news_2026-10-16.jsonl"]
+    benchmark = by_title["Open model tops reasoning benchmark"]
+    # Markup is stripped, tracking parameters dropped and dates converted to UTC
+    assert benchmark["summary"].startswith("A new open-weights model")
+    assert "<p>" not in benchmark["summary"]
+    assert benchmark["url"] == "https://aiwire.example.com/2026/10/open-model-benchmark"
+    assert benchmark["source"] == "rss"
+    assert by_title["Chip maker announces low-power inference accelerator"]["date"] == "2026-10-15T05:00:00Z"
+    # Atom entries fall back to <content> and to a link without rel
+    robotics = by_title["Robotics startup opens its simulation stack"]
+    assert robotics["url"] == "https://mldigest.example.org/posts/robotics-simulation"
+    assert robotics["summary"].startswith("The company released")
+
+
+def test_drops_seen_urls_and_near_duplicates(tmp_path):
+    stats = run(tmp_path, copy_feeds(tmp_path))
+    titles = [item["title"] for item in written_items(tmp_path)]
+    # The Atom copy of the benchmark story differs only in case, punctuation and markup
+    assert "Open Model Tops Reasoning Benchmark!" not in titles
+    assert stats["near_duplicates"] == 1
+    # The syndicated audit-rules entry has the same URL once tracking parameters are dropped
+    assert titles.count("Regulators publish draft rules for AI audits") == 1
+    assert stats["seen_urls"] == 1
+    assert stats["written"] == len(titles) == 4
+
+
+def test_second_run_skips_seen_items(tmp_path):
+    feeds = copy_feeds(tmp_path)
+    run(tmp_path, feeds)
+    before = written_items(tmp_path)
+
+    # Unchanged feeds are not even parsed
+    stats = run(tmp_path, feeds)
+    assert stats["unchanged_feeds"] == 2
+    assert stats["written"] == 0
+
+    # Re-published feeds are parsed again, but every item was seen already
+    for feed in feeds:
+        stat = os.stat(feed)
+        os.utime(feed, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    stats = run(tmp_path, feeds)
+    assert stats.get("unchanged_feeds", 0) == 0
+    assert stats["written"] == 0
+    assert stats["seen_urls"] == 6
+    assert written_items(tmp_path) == before
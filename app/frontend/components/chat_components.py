@@ -29,18 +29,24 @@ def chat_with_ai(user_input):
     st.session_state.conversation.append({"role": "user", "content": user_input})
     
     try:
-        # Call API for AI response
-        response = requests.post(
-            f"{API_URL}/chat",
-            json={
-                "message": user_input,
-                "user_id": st.session_state.user_id,
-                "history": st.session_state.conversation[:-1]  # Exclude the latest user message
-            }
-        )
+        # Call API for AI response; once the API holds the conversation, only the new message is sent
+        payload = {"message": user_input, "user_id": st.session_state.user_id}
+        if st.session_state.get('conversation_id'):
+            payload["conversation_id"] = st.session_state.conversation_id
+        else:
+            payload["history"] = st.session_state.conversation[:-1]  # Exclude the latest user message
+        response = requests.post(f"{API_URL}/chat", json=payload)
+        
+        if response.status_code == 404 and "conversation_id" in payload:
+            # The API no longer knows this conversation; start a new one from our copy
+            del payload["conversation_id"]
+            payload["history"] = st.session_state.conversation[:-1]
+            response = requests.post(f"{API_URL}/chat", json=payload)
         
         if response.status_code == 200:
-            ai_response = response.json().get("response", "Sorry, I couldn't process that.")
+            result = response.json()
+            ai_response = result.get("response", "Sorry, I couldn't process that.")
+            st.session_state.conversation_id = result.get("conversation_id")
         else:
             ai_response = f"Error: Received status code {response.status_code} from API"
     except Exception as e:
@@ -83,5 +89,6 @@ def clear_conversation():
     """Clear the conversation history from session state"""
     if 'conversation' in st.session_state:
         st.session_state.conversation = []
+        st.session_state.conversation_id = None
         return True
     return False
\ No newline at end of file
@@ -4,6 +4,8 @@ import plotly.graph_objects as go
 import requests
 import random
 import os
+import msgpack
+import numpy as np
 from datetime import datetime, timedelta
 import logging
 
@@ -11,6 +13,16 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def decode_columns(response):
+    """Decode a /stocks response body, either JSON or msgpack with typed arrays"""
+    if response.headers.get("content-type", "").startswith("application/x-msgpack"):
+        payload = msgpack.unpackb(response.content, raw=False)
+        return {
+            key: np.frombuffer(value["data"], dtype=value["dtype"]) if isinstance(value, dict) and "dtype" in value else value
+            for key, value in payload.items()
+        }
+    return response.json()
+
 def get_stock_data():
     """Fetch stock data from API or fallback to generated data if API fails"""
     # APIのURLを環境変数から取得するか、デフォルト値を使用
@@ -20,11 +32,25 @@ def get_stock_data():
         # Get stock symbol from session state if available
         symbol = st.session_state.get('stock_symbol', '7974.T')  # Default to Nintendo
         
+        # Revalidate the last response for this symbol instead of refetching it
+        stock_cache = st.session_state.setdefault('stock_cache', {})
+        headers = {"Accept": "application/x-msgpack, application/json;q=0.5"}
+        cached = stock_cache.get(symbol)
+        if cached:
+            headers["If-None-Match"] = cached["etag"]
+        
         # Make API request with the selected stock symbol
-        response = requests.get(f"{api_url}/stocks?symbol={symbol}")
+        response = requests.get(
+            f"{api_url}/stocks",
+            params={"symbol": symbol, "indicators": "sma5,sma20", "max_points": 500},
+            headers=headers,
+        )
         
-        if response.status_code == 200:
-            data = response.json()
+        if response.status_code == 304 and cached:
+            logger.info(f"Stock data for {symbol} not modified, using cached copy")
+            return cached["df"].copy()
+        elif response.status_code == 200:
+            data = decode_columns(response)
             
             # Convert to DataFrame
             df = pd.DataFrame(data)
@@ -37,6 +63,8 @@ def get_stock_data():
             df['Symbol'] = symbol
             print(f"Fetched data for {symbol}: {df.head()}")
             
+            if response.headers.get("ETag"):
+                stock_cache[symbol] = {"etag": response.headers["ETag"], "df": df.copy()}
             return df
         else:
             st.error(f"Failed to fetch stock data: {response.status_code}")
@@ -77,24 +105,24 @@ def display_stock_chart():
         name='Price'
     )])
     
-    # # Add moving averages if they exist
-    # if 'MA5' in df.columns:
-    #     fig.add_trace(go.Scatter(
-    #         x=df['Date'], 
-    #         y=df['MA5'], 
-    #         mode='lines',
-    #         line=dict(color='blue', width=1),
-    #         name='MA5'
-    #     ))
+    # Add moving averages if they exist
+    if 'SMA5' in df.columns:
+        fig.add_trace(go.Scatter(
+            x=df['Date'], 
+            y=df['SMA5'], 
+            mode='lines',
+            line=dict(color='blue', width=1),
+            name='MA5'
+        ))
     
-    # if 'MA20' in df.columns:
-    #     fig.add_trace(go.Scatter(
-    #         x=df['Date'], 
-    #         y=df['MA20'], 
-    #         mode='lines',
-    #         line=dict(color='orange', width=1),
-    #         name='MA20'
-    #     ))
+    if 'SMA20' in df.columns:
+        fig.add_trace(go.Scatter(
+            x=df['Date'], 
+            y=df['SMA20'], 
+            mode='lines',
+            line=dict(color='orange', width=1),
+            name='MA20'
+        ))
     
     # Update layout
     fig.update_layout(
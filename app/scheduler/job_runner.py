@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+import schedule
+
+logger = logging.getLogger(__name__)
+
+
+class JobRunner:
+    """Runs ``schedule`` jobs on a worker pool instead of the scheduling thread.
+
+    - A job is skipped while its previous run is still going.
+    - A failed run (the job raised) is retried after an exponential backoff
+      with jitter, up to ``max_retries`` times.
+    - The start of every successful run is persisted in ``state_path``; at
+      startup a job whose last scheduled slot passed while the scheduler
+      was down (or that never ran) is run once right away.
+    - The last ``history`` run durations of every job are kept, and every
+      run is recorded in ``run_history`` when one is given.
+
+    ``run_forever`` sleeps exactly until the next job or retry is due, so
+    jobs start within a second of their scheduled time.
+    """
+
+    def __init__(self, state_path: str, max_workers: int = 4, max_retries: int = 3,
+                 backoff_base: float = 30, backoff_max: float = 1800, history: int = 20,
+                 scheduler: Optional[schedule.Scheduler] = None, run_history=None):
+        self.state_path = state_path
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.scheduler = scheduler or schedule.default_scheduler
+        self.run_history = run_history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs: Dict[str, Callable] = {}
+        self._schedules: Dict[str, schedule.Job] = {}
+        self._running = set()
+        self._retries: Dict[str, Tuple[float, int]] = {}  # name -> (due at, attempt)
+        self._durations: Dict[str, deque] = {}
+        self._history = history
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._state = self._load_state()
+
+    def _load_state(self) -> dict:
+        try:
+            with open(self.state_path) as fp:
+                return json.load(fp)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.error(f"Could not read scheduler state {self.state_path}, starting fresh: {e}")
+            return {}
+
+    def _save_state(self):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w") as fp:
+            json.dump(self._state, fp, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def add(self, name: str, job: schedule.Job, fn: Callable):
+        """Run ``fn`` on the schedule of ``job`` (e.g. ``schedule.every().day.at("03:00")``)"""
+        self._jobs[name] = fn
+        self._schedules[name] = job.do(self.dispatch, name)
+        self._durations[name] = deque(
+            self._state.get(name, {}).get("durations", [])[-self._history:], maxlen=self._history)
+
+    def dispatch(self, name: str, attempt: int = 0):
+        """Start a run of ``name`` on the pool, unless one is already in progress"""
+        with self._lock:
+            if name in self._running:
+                logger.warning(f"Skipping {name}: previous run still in progress")
+                return
+            self._running.add(name)
+            self._retries.pop(name, None)
+        self._executor.submit(self._run, name, attempt)
+
+    def _run(self, name: str, attempt: int):
+        started = time.time()
+        retry_at = None
+        try:
+            logger.info(f"Running job {name}" + (f" (retry {attempt})" if attempt else ""))
+            result = self._jobs[name]()
+        except Exception as e:
+            duration = time.time() - started
+            if attempt < self.max_retries:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.5)
+                retry_at = time.time() + delay
+                logger.error(f"Job {name} failed after {duration:.1f}s, retrying in {delay:.0f}s: {e}")
+            else:
+                logger.error(f"Job {name} failed after {duration:.1f}s, giving up after {attempt} retries: {e}")
+            self._record(name, started, duration, "failed", {"error": str(e), "attempt": attempt})
+        else:
+            duration = time.time() - started
+            logger.info(f"Job {name} finished in {duration:.1f}s")
+            self._record(name, started, duration, "succeeded",
+                         {"result": result, "attempt": attempt} if attempt else {"result": result})
+        finally:
+            with self._lock:
+                self._running.discard(name)
+                if retry_at is not None:
+                    self._retries[name] = (retry_at, attempt + 1)
+            if retry_at is not None:
+                self._wake.set()
+
+    def _record(self, name: str, started: float, duration: float, status: str, detail: dict):
+        if self.run_history is not None:
+            try:
+                self.run_history.record(name, status, started, round(duration, 3), detail)
+            except Exception as e:
+                logger.error(f"Could not record run of {name}: {e}")
+        with self._lock:
+            self._durations[name].append(round(duration, 3))
+            state = self._state.setdefault(name, {})
+            state.update({"last_started": started, "last_status": status,
+                          "durations": list(self._durations[name])})
+            if status == "succeeded":
+                state["last_success"] = started
+            self._save_state()
+
+    def catch_up(self):
+        """Run every job whose most recent scheduled slot was missed"""
+        now = time.time()
+        for name, job in self._schedules.items():
+            last_success = self._state.get(name, {}).get("last_success")
+            if job.at_time is None:
+                # Interval job: due one period after its last run, not one period after startup
+                if last_success is not None and last_success + job.period.total_seconds() > now:
+                    job.next_run = datetime.fromtimestamp(last_success) + job.period
+                    continue
+            elif last_success is not None and last_success >= (job.next_run - job.period).timestamp():
+                continue
+            logger.info(f"Catching up on missed run of {name}")
+            self.dispatch(name)
+
+    def _due_retries(self):
+        now = time.time()
+        with self._lock:
+            due = [(name, attempt) for name, (at, attempt) in self._retries.items() if at <= now]
+        for name, attempt in due:
+            self.dispatch(name, attempt)
+
+    def _seconds_until_next(self) -> float:
+        idle = self.scheduler.idle_seconds
+        candidates = [idle if idle is not None else 60.0]
+        with self._lock:
+            candidates += [at - time.time() for at, _ in self._retries.values()]
+        return max(0.0, min(candidates))
+
+    def run_forever(self):
+        while True:
+            self.scheduler.run_pending()
+            self._due_retries()
+            self._wake.wait(self._seconds_until_next())
+            self._wake.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    "running": name in self._running,
+                    "next_run": job.next_run.isoformat() if job.next_run else None,
+                    "retry_at": self._retries[name][0] if name in self._retries else None,
+                    "last_status": self._state.get(name, {}).get("last_status"),
+                    "last_success": self._state.get(name, {}).get("last_success"),
+                    "durations": list(self._durations[name]),
+                }
+                for name, job in self._schedules.items()
+            }
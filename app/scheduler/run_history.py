@@ -0,0 +1,94 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job TEXT NOT NULL,
+    status TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    duration REAL,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_job_started ON runs (job, started_at);
+CREATE INDEX IF NOT EXISTS runs_status_started ON runs (status, started_at);
+"""
+
+_LEGACY_LOG_RE = re.compile(r"^fetch_log_(\d{8}_\d{6})\.json$")
+
+
+class RunHistory:
+    """Append-only history of scheduler runs in one SQLite database.
+
+    Rows older than ``retention_days`` are deleted by ``compact``, which
+    also vacuums the file once enough space has been freed. The database
+    is in WAL mode, so the API can read it while runs are being recorded.
+    """
+
+    def __init__(self, path: str, retention_days: float = 90):
+        self.path = path
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def record(self, job: str, status: str, started_at: float, duration: Optional[float] = None,
+               detail: Optional[dict] = None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO runs (job, status, started_at, duration, detail) VALUES (?, ?, ?, ?, ?)",
+                (job, status, started_at, duration, json.dumps(detail) if detail is not None else None),
+            )
+
+    def compact(self) -> int:
+        """Delete runs past the retention period; returns how many were removed"""
+        cutoff = time.time() - self.retention_days * 86400
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM runs WHERE started_at < ?", (cutoff,)).rowcount
+            free_pages = self._conn.execute("PRAGMA freelist_count").fetchone()[0]
+            page_count = self._conn.execute("PRAGMA page_count").fetchone()[0]
+            if page_count and free_pages / page_count > 0.25:
+                self._conn.execute("VACUUM")
+        logger.info(f"Compacted run history: {removed} runs older than {self.retention_days} days removed")
+        return removed
+
+    def import_legacy_logs(self, directories: Dict[str, str]) -> int:
+        """Move ``fetch_log_<timestamp>.json`` files into the table and delete them.
+
+        ``directories`` maps each data directory to the job that wrote its logs.
+        """
+        imported = 0
+        for directory, job in directories.items():
+            try:
+                names = sorted(os.listdir(directory))
+            except FileNotFoundError:
+                continue
+            for name in names:
+                match = _LEGACY_LOG_RE.match(name)
+                if not match:
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    with open(path) as fp:
+                        log = json.load(fp)
+                    started_at = datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").timestamp()
+                except Exception as e:
+                    logger.error(f"Could not import legacy run log {path}: {e}")
+                    continue
+                status = "succeeded" if log.get("status") == "completed" else log.get("status", "unknown")
+                self.record(job, status, started_at, detail={"imported_from": name, **log})
+                os.remove(path)
+                imported += 1
+        if imported:
+            logger.info(f"Imported {imported} legacy run logs into {self.path}")
+        return imported
@@ -1,15 +1,17 @@
 import os
-import time
 import schedule
 import requests
 import logging
 import json
-from datetime import datetime
 import pandas as pd
 from pathlib import Path
 import threading
 from http.server import BaseHTTPRequestHandler, HTTPServer
 
+from job_runner import JobRunner
+from run_history import RunHistory
+from stock_ingest import StockIngester, TokenBucket, load_watchlist
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -26,11 +28,40 @@ os.makedirs(f"{DATA_DIR}/news", exist_ok=True)
 os.makedirs(f"{DATA_DIR}/papers", exist_ok=True)
 os.makedirs(f"{DATA_DIR}/stocks", exist_ok=True)
 
+# Jobs run on a worker pool; failed runs are retried and missed runs caught up after downtime
+SCHEDULER_WORKERS = int(os.environ.get("SCHEDULER_WORKERS", 4))
+JOB_MAX_RETRIES = int(os.environ.get("JOB_MAX_RETRIES", 3))
+JOB_BACKOFF_BASE = float(os.environ.get("JOB_BACKOFF_BASE", 30))
+# Every run is recorded in one SQLite database, read by the API's /runs endpoint
+RUN_HISTORY_RETENTION_DAYS = float(os.environ.get("RUN_HISTORY_RETENTION_DAYS", 90))
+run_history = RunHistory(f"{DATA_DIR}/runs.sqlite3", retention_days=RUN_HISTORY_RETENTION_DAYS)
+runner = JobRunner(f"{DATA_DIR}/scheduler_state.json", max_workers=SCHEDULER_WORKERS,
+                   max_retries=JOB_MAX_RETRIES, backoff_base=JOB_BACKOFF_BASE, run_history=run_history)
+
+# Watchlist ingested into DATA_DIR/stocks in the format the API's stock store serves from
+STOCK_WATCHLIST = load_watchlist(os.environ.get("STOCK_WATCHLIST", "7974.T"),
+                                 os.environ.get("STOCK_WATCHLIST_FILE", ""))
+STOCK_INGEST_INTERVAL = int(os.environ.get("STOCK_INGEST_INTERVAL", 900))  # seconds
+STOCK_INGEST_WORKERS = int(os.environ.get("STOCK_INGEST_WORKERS", 8))
+STOCK_INGEST_RATE = float(os.environ.get("STOCK_INGEST_RATE", 2))  # upstream requests per second
+STOCK_INGEST_BURST = float(os.environ.get("STOCK_INGEST_BURST", 5))
+stock_ingester = StockIngester(f"{DATA_DIR}/stocks", TokenBucket(STOCK_INGEST_RATE, STOCK_INGEST_BURST),
+                               workers=STOCK_INGEST_WORKERS,
+                               initial_period=os.environ.get("STOCK_INGEST_PERIOD", "1y"))
+
 def run_health_server():
     """Simple HTTP server to respond on health checks"""
     port = int(os.environ.get("PORT", 8080))  # default to 8080 instead of 8080
     class HealthHandler(BaseHTTPRequestHandler):
         def do_GET(self):
+            if self.path == "/jobs":
+                # Per-job status and recent run durations
+                body = json.dumps(runner.stats()).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(body)
+                return
             self.send_response(200)
             self.end_headers()
             self.wfile.write(b"OK")
@@ -49,13 +80,11 @@ def fetch_ai_news():
         
         logger.info(f"News fetching API call successful: {response.status_code}")
         
-        # In a real implementation, we might do more post-processing here
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        with open(f"{DATA_DIR}/news/fetch_log_{timestamp}.json", "w") as f:
-            json.dump({"timestamp": timestamp, "status": "completed"}, f)
-            
+        # Returned details are stored with the run in the run history
+        return {"status_code": response.status_code}
     except Exception as e:
         logger.error(f"Error fetching AI news: {str(e)}")
+        raise
 
 def fetch_research_papers():
     """Fetch research papers and store the results"""
@@ -66,29 +95,24 @@ def fetch_research_papers():
         response.raise_for_status()
         
         logger.info(f"Research papers fetching API call successful: {response.status_code}")
-        
-        # In a real implementation, we might do more post-processing here
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        with open(f"{DATA_DIR}/papers/fetch_log_{timestamp}.json", "w") as f:
-            json.dump({"timestamp": timestamp, "status": "completed"}, f)
-            
+        return {"status_code": response.status_code}
     except Exception as e:
         logger.error(f"Error fetching research papers: {str(e)}")
+        raise
 
 def fetch_stock_data():
-    """Fetch stock data for AI companies and indices"""
-    logger.info("Running scheduled task: Fetch stock data")
+    """Fetch new bars for every symbol in the watchlist into the shared stock store"""
+    logger.info(f"Running scheduled task: Fetch stock data for {len(STOCK_WATCHLIST)} symbols")
     try:
-        # In a real implementation, this would use yfinance or another API
-        # For now, just log that it ran
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        with open(f"{DATA_DIR}/stocks/fetch_log_{timestamp}.json", "w") as f:
-            json.dump({"timestamp": timestamp, "status": "completed"}, f)
-            
-        logger.info("Stock data fetching completed")
+        results = stock_ingester.ingest_all(STOCK_WATCHLIST)
+        failed = {symbol: error for symbol, error in results.items() if error != "ok"}
+        if failed and len(failed) == len(results):
+            raise RuntimeError(f"All {len(failed)} symbols failed")
+        logger.info(f"Stock data fetching completed: {len(results) - len(failed)} ok, {len(failed)} failed")
+        return {"symbols": len(results), "failed": failed}
     except Exception as e:
         logger.error(f"Error fetching stock data: {str(e)}")
+        raise
 
 def main():
     """Main function to set up and run the scheduler"""
@@ -98,26 +122,31 @@ def main():
     
     logger.info("Starting scheduler")
     
+    # Earlier versions wrote one fetch_log_<timestamp>.json per run into the data directories
+    run_history.import_legacy_logs({
+        f"{DATA_DIR}/news": "fetch_ai_news",
+        f"{DATA_DIR}/papers": "fetch_research_papers",
+        f"{DATA_DIR}/stocks": "fetch_stock_data",
+    })
+    
     # Schedule daily news fetching at 3:00 AM
-    schedule.every().day.at("03:00").do(fetch_ai_news)
+    runner.add("fetch_ai_news", schedule.every().day.at("03:00"), fetch_ai_news)
     
     # Schedule weekly research papers fetching on Friday at 8:00 PM
-    schedule.every().friday.at("20:00").do(fetch_research_papers)
+    runner.add("fetch_research_papers", schedule.every().friday.at("20:00"), fetch_research_papers)
+    
+    # Schedule watchlist ingestion every STOCK_INGEST_INTERVAL seconds
+    runner.add("fetch_stock_data", schedule.every(STOCK_INGEST_INTERVAL).seconds, fetch_stock_data)
     
-    # Schedule stock data fetching every 6 hours
-    schedule.every(6).hours.do(fetch_stock_data)
+    # Drop run history past its retention period daily
+    runner.add("compact_run_history", schedule.every().day.at("04:00"), run_history.compact)
     
-    # Run the tasks once at startup for testing
-    logger.info("Running tasks at startup")
-    fetch_ai_news()
-    fetch_research_papers()
-    fetch_stock_data()
+    # Run jobs that never ran or missed their last slot while the scheduler was down
+    runner.catch_up()
     
-    # Keep the scheduler running
+    # Keep the scheduler running, waking up exactly when the next job or retry is due
     logger.info("Scheduler running, waiting for scheduled tasks...")
-    while True:
-        schedule.run_pending()
-        time.sleep(60)  # Check every minute
+    runner.run_forever()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
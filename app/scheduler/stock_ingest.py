@@ -0,0 +1,105 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List
+
+import yfinance as yf
+
+from stock_files import (bar_file_lock, bar_file_path, covered_from, from_history, merge_bars,
+                         read_bar_file, write_bar_file)
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Blocking rate limiter: ``rate`` tokens per second, bursts of up to ``capacity``"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def load_watchlist(symbols: str, path: str = "") -> List[str]:
+    """Symbols from a comma separated list plus, if given, a file with one symbol per line"""
+    watchlist = [s.strip() for s in symbols.split(",") if s.strip()]
+    if path:
+        with open(path) as fp:
+            watchlist += [line.split("#")[0].strip() for line in fp if line.split("#")[0].strip()]
+    return list(dict.fromkeys(watchlist))
+
+
+class StockIngester:
+    """Keeps the per-symbol ``.npz`` bar files under ``root`` up to date for a watchlist.
+
+    A symbol seen for the first time gets ``initial_period`` of history;
+    after that only bars since the last stored one are fetched and merged
+    in. Upstream calls run on ``workers`` threads but never faster than
+    the token bucket allows, so large watchlists don't get throttled.
+    """
+
+    def __init__(self, root: str, limiter: TokenBucket, workers: int = 8, initial_period: str = "1y"):
+        self.root = root
+        self.limiter = limiter
+        self.workers = workers
+        self.initial_period = initial_period
+        os.makedirs(root, exist_ok=True)
+
+    def ingest(self, symbol: str) -> int:
+        """Fetch and store new bars of ``symbol``; returns the number of bars received"""
+        path = bar_file_path(self.root, symbol)
+        stored = read_bar_file(path)
+        self.limiter.acquire()
+        if stored is None:
+            hist = yf.Ticker(symbol).history(period=self.initial_period)
+            if hist.empty:
+                raise ValueError(f"No data returned for symbol {symbol}")
+        else:
+            # The last stored bar is refetched, since it may have been in progress
+            hist = yf.Ticker(symbol).history(start=str(stored[0][-1]))
+        with bar_file_lock(path):
+            # Merge into the file as it is now, in case the API rewrote it meanwhile
+            current = read_bar_file(path) or stored
+            if hist.empty:
+                dates, columns, covered = current[:3]
+            else:
+                new_dates, new_columns = from_history(hist)
+                fetched_from = covered_from(self.initial_period, new_dates) if stored is None else new_dates[0]
+                if current is not None and len(current[0]) and current[0][-1] >= new_dates[0]:
+                    dates, columns = merge_bars(current[0], current[1], new_dates, new_columns)
+                    covered = min(current[2], fetched_from)
+                else:
+                    dates, columns, covered = new_dates, new_columns, fetched_from
+            write_bar_file(path, dates, columns, covered, time.time())
+        return len(hist)
+
+    def ingest_all(self, symbols: Iterable[str]) -> Dict[str, str]:
+        """Ingest every symbol concurrently; returns ``{symbol: "ok" | error message}``"""
+        def run(symbol):
+            try:
+                self.ingest(symbol)
+                return "ok"
+            except Exception as e:
+                logger.error(f"Ingesting {symbol} failed: {e}")
+                return str(e)
+
+        symbols = list(symbols)
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest") as executor:
+            return dict(zip(symbols, executor.map(run, symbols)))
+
@@ -0,0 +1,121 @@
+"""On-disk format of the per-symbol daily bar files.
+
+The API's StockStore serves these files and the scheduler's StockIngester
+keeps the watchlist's files up to date. Both images copy ``app/shared``
+to ``/shared`` and put it on ``PYTHONPATH``, so this one module is what
+both services import.
+
+Each symbol is one ``.npz`` file holding ``Date`` (datetime64[D],
+ascending), ``covered_from`` (bars are complete from this date onwards),
+``fetched_at`` (unix time of the last upstream fetch) and one array per
+price column. Writers merge into a file while holding ``bar_file_lock``,
+so the API and the scheduler never overwrite each other's bars.
+"""
+import os
+import fcntl
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Columns kept for every symbol, in the order they are returned by /stocks
+PRICE_COLUMNS = ("Open", "High", "Low", "Close", "Volume")
+
+# Sentinel start date meaning "the full upstream history is cached"
+FULL_HISTORY = np.datetime64("1900-01-01", "D")
+
+# (dates, columns, covered_from, fetched_at)
+BarFile = Tuple[np.ndarray, Dict[str, np.ndarray], np.datetime64, float]
+
+
+def bar_file_path(root: str, symbol: str) -> str:
+    return os.path.join(root, f"{symbol.replace('/', '_')}.npz")
+
+
+def read_bar_file(path: str) -> Optional[BarFile]:
+    try:
+        with np.load(path) as npz:
+            return (npz["Date"], {col: npz[col] for col in PRICE_COLUMNS},
+                    npz["covered_from"][()], float(npz["fetched_at"][()]))
+    except FileNotFoundError:
+        return None
+
+
+def write_bar_file(path: str, dates: np.ndarray, columns: Dict[str, np.ndarray],
+                   covered_from: np.datetime64, fetched_at: float):
+    """Atomically replace the file at ``path``"""
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(
+        tmp_path,
+        Date=dates,
+        covered_from=np.array(covered_from, dtype="datetime64[D]"),
+        fetched_at=np.array(fetched_at),
+        **columns,
+    )
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def bar_file_lock(path: str):
+    """Exclusive lock on the bar file at ``path``, across threads and processes"""
+    with open(f"{path}.lock", "a") as fp:
+        fcntl.flock(fp, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fp, fcntl.LOCK_UN)
+
+
+def from_history(hist: pd.DataFrame) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Convert a yfinance history frame into (dates, columns) arrays"""
+    index = hist.index
+    if getattr(index, "tz", None) is not None:
+        # Keep the exchange-local calendar date, as the old strftime did
+        index = index.tz_localize(None)
+    dates = index.values.astype("datetime64[D]")
+    columns = {
+        col: hist[col].to_numpy(dtype=np.int64 if col == "Volume" else np.float64)
+        for col in PRICE_COLUMNS
+    }
+    return dates, columns
+
+
+def merge_bars(dates, columns, new_dates, new_columns):
+    """Append ``new_*`` bars, letting them replace any overlapping old bars"""
+    keep = int(np.searchsorted(dates, new_dates[0], side="left"))
+    merged_dates = np.concatenate([dates[:keep], new_dates])
+    merged_columns = {
+        col: np.concatenate([columns[col][:keep], new_columns[col]])
+        for col in PRICE_COLUMNS
+    }
+    return merged_dates, merged_columns
+
+
+def period_start(period: str, today: Optional[np.datetime64] = None) -> Optional[np.datetime64]:
+    """Calendar start date of a yfinance period, or None for 'max'.
+
+    Day based periods ("1d", "5d") count trading days and are handled by
+    ``window_start`` instead, so they return None here as well.
+    """
+    today = pd.Timestamp(today if today is not None else np.datetime64("today", "D"))
+    if period == "ytd":
+        return np.datetime64(f"{today.year}-01-01", "D")
+    if period == "max" or period.endswith("d"):
+        return None
+    if period.endswith("mo"):
+        offset = pd.DateOffset(months=int(period[:-2]))
+    elif period.endswith("y"):
+        offset = pd.DateOffset(years=int(period[:-1]))
+    else:
+        raise ValueError(f"Unsupported period: {period}")
+    return np.datetime64((today - offset).date(), "D")
+
+
+def covered_from(period: str, dates: np.ndarray) -> np.datetime64:
+    """First date from which a ``period`` fetch that returned ``dates`` is complete"""
+    if period == "max":
+        return FULL_HISTORY
+    # The period may start on a holiday, so record the requested start
+    # rather than the first bar, or the next request would miss again
+    return min(dates[0], period_start(period) or dates[0])
@@ -41,5 +41,5 @@ echo "✅ インストール完了！"
 echo ""
 echo "🚀 アプリケーション実行方法："
 echo "   - フロントエンド: cd $PROJECT_ROOT/app/frontend && streamlit run app.py"
-echo "   - API: cd $PROJECT_ROOT/app/api && python main.py"
-echo "   - スケジューラー: cd $PROJECT_ROOT/app/scheduler && python scheduler.py"
\ No newline at end of file
+echo "   - API: cd $PROJECT_ROOT/app/api && PYTHONPATH=$PROJECT_ROOT/app/shared python serve.py"
+echo "   - スケジューラー: cd $PROJECT_ROOT/app/scheduler && PYTHONPATH=$PROJECT_ROOT/app/shared python scheduler.py"
\ No newline at end of file